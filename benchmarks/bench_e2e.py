@@ -0,0 +1,386 @@
+"""End-to-end throughput and latency of the integration against a local broker.
+
+Starts a real Home Assistant instance with N simulated inverters, sets up
+one Qilowatt config entry per inverter and points the qilowatt library at
+the in-process LocalBroker. It then measures:
+
+- startup: time until every inverter published its first SENSOR message
+- throughput: SENSOR publishes per second while the inverter inputs move
+- command latency: from a WORKMODE command leaving the broker to the Mode
+  WorkModeSensor state changing in Home Assistant
+- reconnect recovery: after a broker outage, time until every connection
+  sensor is on again and every inverter published again
+
+    python -m benchmarks.bench_e2e --inverters 50 --json e2e.json
+
+Needs homeassistant and qilowatt installed, nothing else; no network.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from pathlib import Path
+import platform
+import statistics
+import time
+
+from homeassistant.const import EVENT_STATE_CHANGED, STATE_ON
+from homeassistant.const import __version__ as HA_VERSION
+from homeassistant.core import callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+
+from custom_components.qilowatt.const import (
+    CONF_DEVICE_ID,
+    CONF_INVERTER_ID,
+    CONF_INVERTER_MODEL,
+    CONF_MQTT_PASSWORD,
+    CONF_MQTT_USERNAME,
+    CONF_UPDATE_MODE,
+    DOMAIN,
+    UPDATE_MODE_POLL,
+    UPDATE_MODE_PUSH,
+)
+from custom_components.qilowatt.inverter import (
+    INVERTER_INTEGRATIONS,
+    async_get_inverter_class,
+)
+
+from .broker import LocalBroker
+from .local_hass import (
+    CUSTOM_COMPONENTS,
+    add_source_entry,
+    async_start_hass,
+    config_entry,
+)
+
+SOURCE_DOMAIN = "bench_inverter"
+# Every input moves by this much every other tick, so snapshots always change
+SWING = 250
+MANIFEST = CUSTOM_COMPONENTS / DOMAIN / "manifest.json"
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[round((len(ordered) - 1) * fraction)]
+
+
+def _summary_ms(samples):
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    return {
+        "p50": statistics.median(samples) * 1000,
+        "p95": _percentile(samples, 0.95) * 1000,
+        "max": max(samples) * 1000,
+    }
+
+
+async def _wait_for(predicate, timeout):
+    """Wait until predicate() holds, return the seconds waited or None."""
+    start = time.perf_counter()
+    while not predicate():
+        if time.perf_counter() - start > timeout:
+            return None
+        await asyncio.sleep(0.005)
+    return time.perf_counter() - start
+
+
+class SimulatedInverter:
+    """Device and input entities of one inverter in the source integration."""
+
+    def __init__(self, hass, source_entry, index, inverter_class):
+        self.hass = hass
+        self.inverter_id = f"bench{index}"
+        self.device = dr.async_get(hass).async_get_or_create(
+            config_entry_id=source_entry.entry_id,
+            identifiers={(SOURCE_DOMAIN, self.inverter_id)},
+            name=f"Bench inverter {index}",
+        )
+        registry = er.async_get(hass)
+        # entity_id -> base value
+        self.inputs = {}
+        for slot, (key, _as_int, default) in enumerate(inverter_class._plan.inputs):
+            if default is None:
+                # Optional inputs are left out, as on most installations
+                continue
+            separator = "" if key.startswith("_") else "_"
+            entry = registry.async_get_or_create(
+                "sensor",
+                SOURCE_DOMAIN,
+                f"{self.inverter_id}_{key}",
+                suggested_object_id=f"{self.inverter_id}{separator}{key}",
+                device_id=self.device.id,
+            )
+            self.inputs[entry.entity_id] = 10 + slot * 0.5
+        self.drive(0)
+
+    @callback
+    def drive(self, tick):
+        """Write every input, moved by SWING on odd ticks."""
+        offset = SWING * (tick % 2)
+        for entity_id, base in self.inputs.items():
+            self.hass.states.async_set(entity_id, str(base + offset))
+
+
+class E2EBenchmark:
+    """One benchmark run; the phases share the instance and the broker."""
+
+    def __init__(self, args):
+        self.args = args
+        self.hass = None
+        self.broker = LocalBroker()
+        self.inverters = []
+        self.entries = []
+        # (inverter_id, payload bytes, perf_counter) per SENSOR publish
+        self.publishes = []
+        # Mode sensor entity_id -> inverter_id, and the latest change times
+        self._mode_sensors = {}
+        self._mode_changed = {}
+        self.broker.add_listener(self._on_broker_publish)
+
+    def _on_broker_publish(self, topic, payload, now):
+        """Record SENSOR publishes, on the broker thread."""
+        parts = topic.split("/")
+        if parts[-1] == "SENSOR":
+            self.publishes.append((parts[1], len(payload), now))
+
+    def _published_since(self, start):
+        return {inverter_id for inverter_id, _size, at in self.publishes if at >= start}
+
+    @callback
+    def _async_state_changed(self, event):
+        inverter_id = self._mode_sensors.get(event.data["entity_id"])
+        if inverter_id is not None:
+            self._mode_changed[inverter_id] = time.perf_counter()
+
+    @callback
+    def _async_drive(self, tick):
+        for inverter in self.inverters:
+            inverter.drive(tick)
+
+    async def _async_run_ticks(self, seconds, tick=0):
+        """Move the inputs every tick_interval for seconds, return the tick."""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            tick += 1
+            self._async_drive(tick)
+            await asyncio.sleep(self.args.tick_interval)
+        return tick
+
+    async def async_setup(self):
+        """Create the inverters and their Qilowatt entries, time the startup."""
+        args = self.args
+        self.hass = hass = await async_start_hass()
+        inverter_class = await async_get_inverter_class(hass, args.model)
+        source_entry = config_entry(SOURCE_DOMAIN, "Bench inverters")
+        add_source_entry(hass, source_entry)
+        self.inverters = [
+            SimulatedInverter(hass, source_entry, index, inverter_class)
+            for index in range(args.inverters)
+        ]
+
+        start = time.perf_counter()
+        for index, inverter in enumerate(self.inverters):
+            entry = config_entry(
+                DOMAIN,
+                f"Bench {inverter.inverter_id}",
+                data={
+                    CONF_MQTT_USERNAME: f"bench{index % args.accounts}",
+                    CONF_MQTT_PASSWORD: "bench",
+                    CONF_INVERTER_ID: inverter.inverter_id,
+                    CONF_INVERTER_MODEL: args.model,
+                    CONF_DEVICE_ID: inverter.device.id,
+                },
+                options={CONF_UPDATE_MODE: args.mode},
+            )
+            await hass.config_entries.async_add(entry)
+            self.entries.append(entry)
+        expected = {inverter.inverter_id for inverter in self.inverters}
+        waited = await _wait_for(
+            lambda: self._published_since(start) >= expected, args.timeout
+        )
+        registry = er.async_get(hass)
+        self._mode_sensors = {
+            registry.async_get_entity_id(
+                "sensor", DOMAIN, f"{inverter.inverter_id}_Mode"
+            ): inverter.inverter_id
+            for inverter in self.inverters
+        }
+        hass.bus.async_listen(EVENT_STATE_CHANGED, self._async_state_changed)
+        return None if waited is None else (time.perf_counter() - start) * 1000
+
+    async def async_throughput(self):
+        """SENSOR publishes per second while every input keeps moving."""
+        start = time.perf_counter()
+        await self._async_run_ticks(self.args.duration)
+        elapsed = time.perf_counter() - start
+        window = [size for _id, size, at in self.publishes if at >= start]
+        return {
+            "duration_s": elapsed,
+            "publishes": len(window),
+            "publishes_per_s": len(window) / elapsed,
+            "bytes_per_s": sum(window) / elapsed,
+            "publishes_per_inverter_per_s": len(window) / elapsed / len(self.inverters),
+        }
+
+    async def async_command_latency(self):
+        """Latency from a WORKMODE command to the Mode sensor state change."""
+        latencies = []
+        lost = 0
+        for command in range(self.args.commands):
+            mode = ("buy", "sell")[command % 2]
+            payload = "WORKMODE " + json.dumps(
+                {"Mode": mode, "_source": "bench", "PowerLimit": command}
+            )
+            self._mode_changed.clear()
+            sent = {}
+            for inverter in self.inverters:
+                sent[inverter.inverter_id] = time.perf_counter()
+                self.broker.publish(f"Q/{inverter.inverter_id}/cmnd/backlog", payload)
+            await _wait_for(
+                lambda sent=sent: len(self._mode_changed) == len(sent),
+                self.args.timeout,
+            )
+            for inverter_id, at in sent.items():
+                changed = self._mode_changed.get(inverter_id)
+                if changed is None:
+                    lost += 1
+                else:
+                    latencies.append(changed - at)
+        return {
+            "commands": len(latencies) + lost,
+            "lost": lost,
+            **_summary_ms(latencies),
+        }
+
+    def _connected(self, state):
+        registry = er.async_get(self.hass)
+        for inverter in self.inverters:
+            entity_id = registry.async_get_entity_id(
+                "binary_sensor", DOMAIN, f"{inverter.inverter_id}_qw_connected"
+            )
+            current = self.hass.states.get(entity_id)
+            if current is None or (current.state == STATE_ON) != state:
+                return False
+        return True
+
+    async def async_reconnect(self):
+        """Recovery after an outage: connection sensors on, publishing again."""
+        self.broker.drop()
+        await _wait_for(lambda: self._connected(False), self.args.timeout)
+        await self._async_run_ticks(self.args.outage)
+        buffered = sum(
+            len(self.hass.data[DOMAIN][entry.entry_id]["client"].buffer)
+            for entry in self.entries
+        )
+
+        start = time.perf_counter()
+        self.broker.restore()
+        connected = await _wait_for(lambda: self._connected(True), self.args.timeout)
+        expected = {inverter.inverter_id for inverter in self.inverters}
+        published = await _wait_for(
+            lambda: self._published_since(start) >= expected, self.args.timeout
+        )
+        if published is not None:
+            published = time.perf_counter() - start
+        return {
+            "outage_s": self.args.outage,
+            "buffered_snapshots": buffered,
+            "connected_ms": None if connected is None else connected * 1000,
+            "first_publish_ms": None if published is None else published * 1000,
+        }
+
+    async def async_teardown(self):
+        for entry in self.entries:
+            await self.hass.config_entries.async_unload(entry.entry_id)
+        await self.hass.async_stop(force=True)
+        self.broker.close()
+
+
+async def async_run(args):
+    """Run every phase and return the report."""
+    bench = E2EBenchmark(args)
+    with bench.broker.installed():
+        try:
+            startup = await bench.async_setup()
+            # Commands first: the active WORKMODE makes poll mode tick fast
+            commands = await bench.async_command_latency()
+            throughput = await bench.async_throughput()
+            reconnect = await bench.async_reconnect()
+        finally:
+            await bench.async_teardown()
+    manifest = json.loads(Path(MANIFEST).read_text(encoding="utf-8"))
+    return {
+        "integration_version": manifest["version"],
+        "homeassistant_version": HA_VERSION,
+        "python_version": platform.python_version(),
+        "model": args.model,
+        "inverters": args.inverters,
+        "accounts": args.accounts,
+        "update_mode": args.mode,
+        "startup_ms": startup,
+        "throughput": throughput,
+        "command_latency_ms": commands,
+        "reconnect": reconnect,
+    }
+
+
+def _fmt(value, unit="ms"):
+    return "n/a" if value is None else f"{value:.1f}{unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inverters", type=int, default=10)
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        default=1,
+        help="Qilowatt accounts the inverters are spread over, one session each",
+    )
+    parser.add_argument("--model", choices=INVERTER_INTEGRATIONS, default="Solarman")
+    parser.add_argument(
+        "--mode", choices=[UPDATE_MODE_POLL, UPDATE_MODE_PUSH], default=UPDATE_MODE_POLL
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10, help="throughput phase, s"
+    )
+    parser.add_argument(
+        "--tick-interval", type=float, default=1, help="between input changes, s"
+    )
+    parser.add_argument("--commands", type=int, default=20, help="WORKMODE rounds")
+    parser.add_argument("--outage", type=float, default=3, help="broker outage, s")
+    parser.add_argument("--timeout", type=float, default=30, help="per wait, s")
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    report = asyncio.run(async_run(args))
+    throughput = report["throughput"]
+    latency = report["command_latency_ms"]
+    reconnect = report["reconnect"]
+    print(
+        f"{args.inverters} x {args.model} ({args.mode}), "
+        f"startup {_fmt(report['startup_ms'])}"
+    )
+    print(
+        f"throughput  {throughput['publishes_per_s']:.1f} publishes/s, "
+        f"{throughput['bytes_per_s'] / 1024:.1f} KiB/s"
+    )
+    print(
+        f"command     p50 {_fmt(latency['p50'])}  p95 {_fmt(latency['p95'])}  "
+        f"max {_fmt(latency['max'])}  lost {latency['lost']}/{latency['commands']}"
+    )
+    print(
+        f"reconnect   connected {_fmt(reconnect['connected_ms'])}  "
+        f"publishing {_fmt(reconnect['first_publish_ms'])}  "
+        f"buffered {reconnect['buffered_snapshots']}"
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
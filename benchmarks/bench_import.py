@@ -0,0 +1,115 @@
+"""Import time of the integration, as Home Assistant pays it at startup.
+
+Each run imports the integration in a fresh interpreter that already has
+the Home Assistant modules loaded that a running instance has, and times:
+
+- load: the integration package and its config flow, which Home Assistant
+  imports while starting, whether or not an entry exists
+- entry: the modules the first entry imports in the executor at setup,
+  the MQTT client, the qilowatt library and one inverter adapter
+- platforms: the sensor and binary_sensor platforms
+
+    python -m benchmarks.bench_import --runs 20 --json import.json
+
+Needs homeassistant and qilowatt installed, nothing else; no network.
+"""
+
+import argparse
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+PACKAGE = "custom_components.qilowatt"
+# Loaded by Home Assistant before it imports a custom integration
+PRELOADED = (
+    "homeassistant.core",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.entity_platform",
+    "homeassistant.helpers.importlib",
+    "homeassistant.components.sensor",
+    "homeassistant.components.binary_sensor",
+)
+# Imported by the integration only, their presence after load is reported
+LIBRARIES = ("qilowatt", "paho.mqtt.client")
+PHASES = ("load", "entry", "platforms")
+
+
+def _child(model):
+    """Import the phases in this interpreter and print their times as JSON."""
+    for name in PRELOADED:
+        importlib.import_module(name)
+    result = {}
+    start = time.perf_counter()
+    importlib.import_module(PACKAGE)
+    importlib.import_module(f"{PACKAGE}.config_flow")
+    result["load"] = time.perf_counter() - start
+    result["libraries_at_load"] = [name for name in LIBRARIES if name in sys.modules]
+    start = time.perf_counter()
+    importlib.import_module(f"{PACKAGE}.mqtt_client")
+    importlib.import_module(f"{PACKAGE}.inverter").get_inverter_class(model)
+    result["entry"] = time.perf_counter() - start
+    start = time.perf_counter()
+    importlib.import_module(f"{PACKAGE}.sensor")
+    importlib.import_module(f"{PACKAGE}.binary_sensor")
+    result["platforms"] = time.perf_counter() - start
+    print(json.dumps(result))
+
+
+def run(model, runs):
+    """Import in runs fresh interpreters and return the median times in ms."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-m", __spec__.name, "--child", model],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        samples.append(json.loads(output))
+    report = {
+        "model": model,
+        "runs": runs,
+        "python_version": sys.version.split()[0],
+        "libraries_at_load": samples[0]["libraries_at_load"],
+    }
+    for phase in PHASES:
+        times = [sample[phase] * 1e3 for sample in samples]
+        report[f"{phase}_ms_p50"] = statistics.median(times)
+        report[f"{phase}_ms_max"] = max(times)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default="Solarman")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child)
+        return
+
+    report = run(args.model, args.runs)
+    print(f"{'phase':<12}{'p50':>10}{'max':>10}")
+    for phase in PHASES:
+        print(
+            f"{phase:<12}{report[f'{phase}_ms_p50']:>8.1f}ms"
+            f"{report[f'{phase}_ms_max']:>8.1f}ms"
+        )
+    print(
+        "libraries imported at load: "
+        + (", ".join(report["libraries_at_load"]) or "none")
+    )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Benchmark the inverter adapters and MQTTClient.async_update_data offline.
+
+Runs every adapter in INVERTER_INTEGRATIONS against a synthetic hass whose
+inverter device exposes a configurable number of entities, and reports per
+tick: collection time, entity lookups, traced allocations and the end to end
+MQTTClient.async_update_data time against a stub Qilowatt client.
+
+    python -m benchmarks.bench_inverters --sizes 50 500 5000 --json out.json
+
+Needs homeassistant and qilowatt installed, nothing else; no network.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+import tracemalloc
+
+from custom_components.qilowatt import mqtt_client
+from custom_components.qilowatt.inverter import (
+    INVERTER_INTEGRATIONS,
+    get_inverter_class,
+)
+
+from .fake_hass import FakeConfigEntry, build_hass
+
+
+class StubQilowattClient:
+    """QilowattMQTTClient stand-in that counts publishes in memory."""
+
+    def __init__(self, mqtt_username, mqtt_password, device, **kwargs):
+        self.device = device
+        self.connected = True
+        self.published = 0
+        device.set_publish_callback(self._publish)
+
+    def _publish(self, topic, data):
+        json.dumps(data)
+        self.published += 1
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[round((len(ordered) - 1) * fraction)]
+
+
+def bench_collect(inverter, ticks):
+    """Time, lookups and peak traced allocation of one collection per tick."""
+    inverter.async_collect()  # resolve the entity index first
+    durations = []
+    lookups = inverter.lookup_count
+    for _ in range(ticks):
+        start = time.perf_counter()
+        inverter.async_collect()
+        durations.append(time.perf_counter() - start)
+    lookups = (inverter.lookup_count - lookups) / ticks
+
+    tracemalloc.start()
+    peaks = []
+    for _ in range(ticks):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        inverter.async_collect()
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return durations, lookups, statistics.median(peaks)
+
+
+async def bench_update(model, hass, ticks):
+    """Time MQTTClient.async_update_data end to end against the stub client."""
+    hass.loop = asyncio.get_running_loop()
+    client = mqtt_client.MQTTClient(hass, FakeConfigEntry(model))
+    client.qilowatt_client = StubQilowattClient("", "", client.qw_device)
+    await client.async_update_data(force=True)
+    durations = []
+    for _ in range(ticks):
+        start = time.perf_counter()
+        await client.async_update_data(force=True)
+        durations.append(time.perf_counter() - start)
+    client.qw_device.stop_timers()
+    client.inverter.async_unload()
+    return durations
+
+
+def run(sizes, ticks, unavailable):
+    """Run all adapters at all sizes and return one result dict per run."""
+    results = []
+    for model in INVERTER_INTEGRATIONS:
+        inverter_class = get_inverter_class(model)
+        for size in sizes:
+            hass = build_hass(inverter_class, size, unavailable)
+            inverter = inverter_class(hass, FakeConfigEntry(model))
+            durations, lookups, alloc = bench_collect(inverter, ticks)
+            inverter.async_unload()
+            update = asyncio.run(bench_update(model, hass, ticks))
+            results.append(
+                {
+                    "adapter": model,
+                    "entities": size,
+                    "collect_us_p50": statistics.median(durations) * 1e6,
+                    "collect_us_p95": _percentile(durations, 0.95) * 1e6,
+                    "lookups_per_tick": lookups,
+                    "alloc_bytes_per_tick": alloc,
+                    "update_us_p50": statistics.median(update) * 1e6,
+                    "update_us_p95": _percentile(update, 0.95) * 1e6,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 500, 5000])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument(
+        "--unavailable",
+        type=float,
+        default=0.0,
+        help="share of read entities reporting unavailable",
+    )
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    # Warnings are still formatted and filtered, as in production
+    logging.basicConfig(level=logging.ERROR)
+
+    results = run(args.sizes, args.ticks, args.unavailable)
+    print(
+        f"{'adapter':<16}{'entities':>9}{'collect p50':>13}{'p95':>9}"
+        f"{'lookups':>9}{'alloc B':>9}{'update p50':>12}{'p95':>9}"
+    )
+    for row in results:
+        print(
+            f"{row['adapter']:<16}{row['entities']:>9}"
+            f"{row['collect_us_p50']:>11.1f}us{row['collect_us_p95']:>7.1f}us"
+            f"{row['lookups_per_tick']:>9.0f}{row['alloc_bytes_per_tick']:>9.0f}"
+            f"{row['update_us_p50']:>10.1f}us{row['update_us_p95']:>7.1f}us"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
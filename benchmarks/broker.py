@@ -0,0 +1,212 @@
+"""In-process stand-in for the Qilowatt MQTT broker.
+
+LocalBroker routes messages between LocalMQTTClient instances, which
+implement the part of paho.mqtt.client.Client that QilowattMQTTClient
+uses. Client callbacks run on one broker thread, as they run on paho's
+network thread in production, so the integration's thread hand-overs are
+exercised too.
+"""
+
+from contextlib import contextmanager
+import queue
+import threading
+import time
+from unittest.mock import patch
+
+MQTT_ERR_SUCCESS = 0
+MQTT_ERR_NO_CONN = 4
+
+
+class _Message:
+    """Received message with the attributes of paho's MQTTMessage."""
+
+    __slots__ = ("topic", "payload")
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+
+class _PublishResult:
+    """Result of a publish with the rc attribute of paho's MQTTMessageInfo."""
+
+    __slots__ = ("rc",)
+
+    def __init__(self, rc):
+        self.rc = rc
+
+
+class LocalMQTTClient:
+    """paho.mqtt.client.Client look-alike connected to a LocalBroker."""
+
+    def __init__(self, broker):
+        self._broker = broker
+        self._connected = False
+        # Whether the owner wants a connection, reconnected after an outage
+        self.wanted = False
+        self.username = None
+        self.keepalive = 60
+        self.on_connect = None
+        self.on_message = None
+        self.on_disconnect = None
+
+    def reconnect_delay_set(self, min_delay=1, max_delay=120):
+        """Reconnects happen as soon as the broker is back."""
+
+    def tls_set(self, *args, **kwargs):
+        """The local broker needs no TLS."""
+
+    def tls_insecure_set(self, value):
+        """The local broker needs no TLS."""
+
+    def username_pw_set(self, username, password=None):
+        self.username = username
+
+    def is_connected(self):
+        return self._connected
+
+    def connect(self, host, port=1883, keepalive=60):
+        self.wanted = True
+        self._broker.connect(self)
+
+    def loop_start(self):
+        """Callbacks already run on the broker thread."""
+
+    def loop_stop(self):
+        """Callbacks already run on the broker thread."""
+
+    def disconnect(self):
+        self.wanted = False
+        self._broker.disconnect(self, rc=0)
+
+    def subscribe(self, topic, qos=0):
+        self._broker.subscribe(self, topic)
+        return MQTT_ERR_SUCCESS, 0
+
+    def unsubscribe(self, topic):
+        self._broker.unsubscribe(self, topic)
+        return MQTT_ERR_SUCCESS, 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        if not self._connected:
+            return _PublishResult(MQTT_ERR_NO_CONN)
+        self._broker.route(topic, payload)
+        return _PublishResult(MQTT_ERR_SUCCESS)
+
+
+class LocalBroker:
+    """Message router between local clients, with a switchable outage.
+
+    Listeners added with add_listener see every message clients publish as
+    (topic, payload, time.perf_counter()), on the broker thread.
+    """
+
+    def __init__(self):
+        self.online = True
+        self._clients = []
+        # Topic -> subscribed clients
+        self._subscriptions = {}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(
+            target=self._run, name="qilowatt-local-broker", daemon=True
+        )
+        self._thread.start()
+
+    @contextmanager
+    def installed(self):
+        """Make QilowattMQTTClient connect to this broker instead of paho."""
+
+        def factory(*args, **kwargs):
+            return LocalMQTTClient(self)
+
+        with patch("qilowatt.client.mqtt.Client", factory):
+            yield self
+
+    def add_listener(self, listener):
+        """Call listener(topic, payload, time) for every client publish."""
+        self._listeners.append(listener)
+
+    def close(self):
+        """Stop the broker thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def connect(self, client):
+        """Accept client now, or once the broker is back online."""
+        with self._lock:
+            if client not in self._clients:
+                self._clients.append(client)
+            if self.online:
+                self._queue.put((self._connected, client))
+
+    def disconnect(self, client, rc):
+        """Drop the connection of client, telling it with rc."""
+        self._queue.put((self._disconnected, client, rc))
+
+    def subscribe(self, client, topic):
+        with self._lock:
+            self._subscriptions.setdefault(topic, set()).add(client)
+
+    def unsubscribe(self, client, topic):
+        with self._lock:
+            self._subscriptions.get(topic, set()).discard(client)
+
+    def route(self, topic, payload):
+        """Deliver a client publish to the listeners and subscribers."""
+        now = time.perf_counter()
+        for listener in self._listeners:
+            listener(topic, payload, now)
+        self.publish(topic, payload)
+
+    def publish(self, topic, payload):
+        """Send payload to the clients subscribed to topic."""
+        if isinstance(payload, str):
+            payload = payload.encode()
+        with self._lock:
+            subscribers = list(self._subscriptions.get(topic, ()))
+        for client in subscribers:
+            self._queue.put((self._deliver, client, _Message(topic, payload)))
+
+    def drop(self):
+        """Go offline, disconnecting every client as a network failure."""
+        with self._lock:
+            self.online = False
+            clients = list(self._clients)
+        for client in clients:
+            self._queue.put((self._disconnected, client, 1))
+
+    def restore(self):
+        """Come back online and reconnect the clients that want it."""
+        with self._lock:
+            self.online = True
+            clients = [client for client in self._clients if client.wanted]
+        for client in clients:
+            self._queue.put((self._connected, client))
+
+    def _run(self):
+        while (item := self._queue.get()) is not None:
+            func, *args = item
+            func(*args)
+
+    @staticmethod
+    def _connected(client):
+        if client._connected or not client.wanted:
+            return
+        client._connected = True
+        if client.on_connect:
+            client.on_connect(client, None, {}, 0)
+
+    @staticmethod
+    def _disconnected(client, rc):
+        if not client._connected:
+            return
+        client._connected = False
+        if client.on_disconnect:
+            client.on_disconnect(client, None, rc)
+
+    @staticmethod
+    def _deliver(client, message):
+        if client._connected and client.on_message:
+            client.on_message(client, None, message)
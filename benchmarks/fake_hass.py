@@ -0,0 +1,145 @@
+"""Synthetic Home Assistant stand-in for the offline benchmarks.
+
+Only the parts the inverter adapters and MQTTClient touch are provided: a
+states map, an entity registry, the event bus listener API, config paths
+and the executor helper. States are real homeassistant.core.State objects
+so parsing costs match production.
+"""
+
+import tempfile
+
+from homeassistant.core import State
+from homeassistant.helpers import entity_registry as er
+
+DEVICE_ID = "bench_device"
+
+
+class FakeRegistryEntry:
+    """Entity registry entry with the attributes the adapters read."""
+
+    __slots__ = ("entity_id", "device_id", "name")
+
+    def __init__(self, entity_id, device_id, name=None):
+        self.entity_id = entity_id
+        self.device_id = device_id
+        self.name = name
+
+
+class FakeEntityRegistry:
+    """Entity registry backed by a plain dict."""
+
+    def __init__(self):
+        self.entities = {}
+
+    def add(self, entity_id, device_id=DEVICE_ID):
+        self.entities[entity_id] = FakeRegistryEntry(entity_id, device_id)
+
+    def async_get(self, entity_id):
+        return self.entities.get(entity_id)
+
+
+class FakeStates:
+    """State machine backed by a plain dict."""
+
+    def __init__(self):
+        self._states = {}
+
+    def set(self, entity_id, value):
+        self._states[entity_id] = State(entity_id, str(value))
+
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def async_entity_ids(self, domain_filter=None):
+        return list(self._states)
+
+
+class FakeBus:
+    """Event bus that records listeners but never fires."""
+
+    def __init__(self):
+        self.listeners = []
+
+    def async_listen(self, event_type, listener, *args, **kwargs):
+        item = (event_type, listener)
+        self.listeners.append(item)
+        return lambda: self.listeners.remove(item)
+
+
+class FakeConfig:
+    """Config with a throwaway config directory."""
+
+    def __init__(self):
+        self.config_dir = tempfile.mkdtemp(prefix="qilowatt-bench-")
+
+    def path(self, *parts):
+        return "/".join((self.config_dir, *parts))
+
+
+class FakeHass:
+    """The subset of HomeAssistant used by the integration's hot path."""
+
+    def __init__(self):
+        self.states = FakeStates()
+        self.bus = FakeBus()
+        self.config = FakeConfig()
+        self.data = {}
+        self.entity_registry = FakeEntityRegistry()
+        self.data[er.DATA_REGISTRY] = self.entity_registry
+        self.loop = None
+
+    def async_add_executor_job(self, target, *args):
+        return self.loop.run_in_executor(None, target, *args)
+
+
+class FakeConfigEntry:
+    """Config entry for an inverter model."""
+
+    def __init__(self, inverter_model, options=None):
+        self.entry_id = f"bench_{inverter_model.lower()}"
+        self.title = f"Bench {inverter_model}"
+        self.data = {
+            "mqtt_username": "bench",
+            "mqtt_password": "bench",
+            "inverter_id": f"bench-{inverter_model.lower()}",
+            "inverter_model": inverter_model,
+            "device_id": DEVICE_ID,
+        }
+        self.options = options or {}
+
+
+def entity_id_for_key(key):
+    """Entity id that resolves from an adapter key for every adapter."""
+    if key.startswith("_"):
+        return f"sensor.inverter{key}"
+    return f"sensor.{key}"
+
+
+def build_hass(inverter_class, n_entities, unavailable=0.0):
+    """Build a FakeHass whose inverter device exposes n_entities entities.
+
+    The keys the adapter reads are registered last, so suffix scans over
+    the device entities hit their worst case. A share of the read entities
+    given by unavailable reports "unavailable".
+    """
+    hass = FakeHass()
+    keys = [key for key, _as_int, _default in inverter_class._plan.inputs]
+    for index in range(max(n_entities - len(keys), 0)):
+        entity_id = f"sensor.inverter_filler_{index}"
+        hass.entity_registry.add(entity_id)
+        hass.states.set(entity_id, index)
+    # Unrelated entities elsewhere in the instance
+    for index in range(n_entities):
+        entity_id = f"sensor.other_device_{index}"
+        hass.entity_registry.add(entity_id, device_id="other")
+        hass.states.set(entity_id, index)
+
+    unavailable_every = round(1 / unavailable) if unavailable else 0
+    for index, key in enumerate(keys):
+        entity_id = entity_id_for_key(key)
+        hass.entity_registry.add(entity_id)
+        if unavailable_every and index % unavailable_every == 0:
+            hass.states.set(entity_id, "unavailable")
+        else:
+            hass.states.set(entity_id, 10 + index * 0.5)
+    return hass
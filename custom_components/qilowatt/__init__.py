@@ -1,14 +1,19 @@
-"""Qilowatt integration for Home Assistant."""
+"""Qilowatt integration for Home Assistant.
+
+The MQTT client, the qilowatt library and the inverter adapter are imported
+in the executor when the first entry is set up, not when Home Assistant
+loads the integration.
+"""
 
 import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import config_validation as cv
-from homeassistant.const import EVENT_HOMEASSISTANT_STARTED
-from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.importlib import async_import_module
 
-from .const import DATA_CLIENT, DOMAIN
-from .mqtt_client import MQTTClient
+from .buffer import buffer_path, remove_buffer
+from .const import CONF_INVERTER_MODEL, DATA_CLIENT, DATA_DISCOVERY, DOMAIN
+from .inverter import async_get_inverter_class
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -21,40 +26,57 @@ async def async_setup(hass: HomeAssistant, config: dict):
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Set up Qilowatt from a config entry with a 60s delay after HA start."""
-
-    async def _delayed_start(_now):
-        hass.data.setdefault(DOMAIN, {})
-        client = MQTTClient(hass, entry)
-        hass.data[DOMAIN][entry.entry_id] = {DATA_CLIENT: client}
-
-        # Start the client asynchronously
-        await client.start()
-
-        # Use the new method and await it
-        await hass.config_entries.async_forward_entry_setups(
-            entry, ["sensor", "binary_sensor"]
-        )
-
-        _LOGGER.warning("Qilowatt integration started after 60 seconds delay")
+    """Set up Qilowatt from a config entry.
+
+    The client starts publishing in the background once the inverter's
+    entities report values, connecting to Qilowatt meanwhile.
+    """
+    hass.data.setdefault(DOMAIN, {})
+    mqtt_client = await async_import_module(hass, f"{__name__}.mqtt_client")
+    # Loaded here so MQTTClient finds the adapter already imported
+    await async_get_inverter_class(hass, entry.data[CONF_INVERTER_MODEL])
+    client = mqtt_client.MQTTClient(hass, entry)
+    hass.data[DOMAIN][entry.entry_id] = {DATA_CLIENT: client}
+
+    await hass.config_entries.async_forward_entry_setups(
+        entry, ["sensor", "binary_sensor"]
+    )
+    client.async_schedule_start()
+
+    # Options take effect through a reload of the entry
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
 
-    async def _schedule_start(_event):
-        _LOGGER.warning("Qilowatt integration will be started after 60 seconds delay")
-        async_call_later(hass, 60, _delayed_start)
+    return True
 
-    # Ждём запуска всей системы, потом даём 60 секунд задержки
-    hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STARTED, _schedule_start)
 
-    return True
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry):
+    """Reload the entry after its options changed."""
+    await hass.config_entries.async_reload(entry.entry_id)
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload a Qilowatt config entry."""
     client = hass.data[DOMAIN][entry.entry_id][DATA_CLIENT]
-    await hass.async_add_executor_job(client.stop)
+    await client.async_stop()
     hass.data[DOMAIN].pop(entry.entry_id)
 
     await hass.config_entries.async_forward_entry_unload(entry, "sensor")
     await hass.config_entries.async_forward_entry_unload(entry, "binary_sensor")
 
+    data = hass.data[DOMAIN]
+    if not any(
+        other.entry_id in data for other in hass.config_entries.async_entries(DOMAIN)
+    ):
+        # Last entry gone, stop following the device registry
+        discovery = data.pop(DATA_DISCOVERY, None)
+        if discovery is not None:
+            discovery.async_unload()
+
     return True
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Delete the snapshot buffer of a removed config entry."""
+    await hass.async_add_executor_job(
+        remove_buffer, buffer_path(hass, entry.entry_id)
+    )
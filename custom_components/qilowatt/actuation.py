@@ -0,0 +1,192 @@
+"""Apply WORKMODE commands to the inverter's control entities."""
+
+import asyncio
+import logging
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers.event import async_track_state_change_event
+
+from .const import ACTUATION_FIELDS, ACTUATION_VERIFY_TIMEOUT, DOMAIN
+from .inverter.controls import SelectControl, control_for_entity
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WorkModeActuator:
+    """Write each WORKMODE to the inverter as one minimal, verified batch.
+
+    The controls of the inverter class, or the entities configured in the
+    options, are written in ACTUATION_FIELDS order. Controls whose entity
+    already has the target are skipped. After the batch the states are read
+    back until they show the targets; the time from receiving the command
+    to that point is recorded in stats.actuation. A command arriving while
+    a batch runs is applied, as the latest one, once it finished.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        config_entry,
+        inverter,
+        coordinator,
+        stats,
+        entities=None,
+        mode_options=None,
+    ) -> None:
+        """Initialize the actuator from the inverter's CONTROLS."""
+        self.hass = hass
+        self.config_entry = config_entry
+        self.inverter = inverter
+        self.coordinator = coordinator
+        self.stats = stats
+        # Field -> control, configured entities replace the built-in ones
+        controls = {control.field: control for control in inverter.CONTROLS}
+        mode = controls.get("Mode")
+        if mode_options and isinstance(mode, SelectControl):
+            controls["Mode"] = mode.with_options(mode_options)
+        for field, entity_id in (entities or {}).items():
+            controls[field] = control_for_entity(field, entity_id, mode_options)
+        self.controls = [
+            controls[field] for field in ACTUATION_FIELDS if field in controls
+        ]
+        self._task = None
+        self._pending = False
+        self._unsub = None
+        if self.controls:
+            self._unsub = coordinator.async_add_listener(self._async_command_changed)
+
+    @callback
+    def async_unload(self):
+        """Stop following commands and cancel a running batch."""
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def _resolve(self, control):
+        """entity_id a control writes to, None when the inverter lacks it."""
+        if "." in control.key:
+            return control.key
+        for entity_id in self.inverter.inverter_entities:
+            domain = entity_id.split(".", 1)[0]
+            if domain in control.domains and entity_id.endswith(control.key):
+                return entity_id
+        return None
+
+    @callback
+    def _async_command_changed(self):
+        """Apply the new command, after the batch in progress if any."""
+        if self._task and not self._task.done():
+            self._pending = True
+            return
+        self._task = self.config_entry.async_create_background_task(
+            self.hass,
+            self._async_run(),
+            f"{DOMAIN} actuation {self.config_entry.entry_id}",
+        )
+
+    async def _async_run(self):
+        """Apply commands until no newer one is pending."""
+        while True:
+            self._pending = False
+            command = self.coordinator.command
+            received = self.coordinator.received
+            try:
+                await self._async_apply(command, received)
+            except Exception as e:  # pylint: disable=broad-except
+                _LOGGER.error("Error applying WORKMODE: %s", e)
+            if not self._pending:
+                return
+
+    @callback
+    def _async_plan(self, command):
+        """Return [(control, entity_id, target)] of the writes command needs."""
+        batch = []
+        for control in self.controls:
+            target = control.target(command)
+            if target is None:
+                continue
+            entity_id = self._resolve(control)
+            if entity_id is None:
+                continue
+            state = self.hass.states.get(entity_id)
+            if state is None:
+                _LOGGER.debug("Control %s does not exist, skipping", entity_id)
+                continue
+            if not control.accepts(state, target):
+                _LOGGER.debug("%s cannot be set to %s, skipping", entity_id, target)
+                continue
+            if control.matches(state, target):
+                continue
+            batch.append((control, entity_id, target))
+        return batch
+
+    async def _async_apply(self, command, received):
+        """Write one command and wait until the inverter reports it."""
+        batch = self._async_plan(command)
+        if not batch:
+            _LOGGER.debug("Inverter already matches WORKMODE %s", command.Mode)
+            return
+        _LOGGER.debug("Applying WORKMODE with %d writes", len(batch))
+        for control, entity_id, target in batch:
+            domain, service, data = control.service_call(entity_id, target)
+            try:
+                await self.hass.services.async_call(
+                    domain, service, data, blocking=True
+                )
+            except (HomeAssistantError, vol.Invalid) as e:
+                _LOGGER.warning("Could not set %s to %s: %s", entity_id, target, e)
+        failed = await self._async_read_back(batch)
+        if failed:
+            self.stats.actuation_failures += 1
+            _LOGGER.warning(
+                "Inverter did not take the WORKMODE within %ss: %s",
+                ACTUATION_VERIFY_TIMEOUT,
+                ", ".join(f"{entity_id} != {target}" for entity_id, target in failed),
+            )
+            return
+        self.stats.actuation.add(time.monotonic() - received)
+
+    async def _async_read_back(self, batch):
+        """Wait until the written entities show their targets.
+
+        Return the (entity_id, target) pairs that still differ at the
+        timeout, an empty list on success.
+        """
+
+        @callback
+        def _async_failed():
+            return [
+                (entity_id, target)
+                for control, entity_id, target in batch
+                if not control.matches(self.hass.states.get(entity_id), target)
+            ]
+
+        if not _async_failed():
+            return []
+        done = self.hass.loop.create_future()
+
+        @callback
+        def _async_state_changed(_event: Event) -> None:
+            if not done.done() and not _async_failed():
+                done.set_result(None)
+
+        unsub = async_track_state_change_event(
+            self.hass,
+            [entity_id for _control, entity_id, _target in batch],
+            _async_state_changed,
+        )
+        try:
+            async with asyncio.timeout(ACTUATION_VERIFY_TIMEOUT):
+                await done
+        except TimeoutError:
+            return _async_failed()
+        finally:
+            unsub()
+        return []
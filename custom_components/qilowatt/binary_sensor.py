@@ -11,7 +11,6 @@ from homeassistant.components.binary_sensor import (
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import async_generate_entity_id
 from homeassistant.helpers.entity_platform import AddConfigEntryEntitiesCallback
 
 from .const import DATA_CLIENT, DOMAIN
@@ -45,10 +44,8 @@ class QilowattConnectionSensor(BinarySensorEntity):
         self._attr_translation_key = "qw_connected"
         self._attr_is_on = False
 
-        # Set explicit entity ID
-        self.entity_id = async_generate_entity_id(
-            "binary_sensor.{}", "qw_connected", hass.states.async_entity_ids()
-        )
+        # Suggested entity ID, the entity registry makes it unique
+        self.entity_id = "binary_sensor.qw_connected"
 
         # Set up device info
         self._attr_device_info = {
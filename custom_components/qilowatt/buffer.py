@@ -0,0 +1,114 @@
+"""Bounded on-disk buffer for snapshots taken while disconnected."""
+
+from collections import deque
+from itertools import islice
+import json
+import logging
+import os
+import threading
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def buffer_path(hass, entry_id):
+    """Return the buffer file of a config entry under the config dir."""
+    return hass.config.path(".storage", f"qilowatt.{entry_id}.buffer")
+
+
+def remove_buffer(path):
+    """Delete a buffer file if it exists."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class TelemetryBuffer:
+    """Ring buffer of timestamped snapshots mirrored to an append-only file.
+
+    Each line of the file is one compact JSON entry
+    ``[epoch, time, energy, metrics]``. The deque holds at most max_entries
+    snapshots and entries older than max_age seconds are dropped. The file
+    is rewritten from the deque only when it grows past twice the limit or
+    after a replay, so normal buffering is a single appended line.
+
+    Methods do file I/O or wait on the file lock, run them in the executor.
+    """
+
+    def __init__(self, path, max_entries, max_age):
+        self.path = path
+        self.max_age = max_age
+        self._entries = deque(maxlen=max_entries)
+        self._file_lines = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        """Load entries persisted by a previous run."""
+        if not os.path.exists(self.path):
+            return
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            with open(self.path, encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn last line after a crash
+                        continue
+                    if entry[0] >= cutoff:
+                        self._entries.append(entry)
+            self._rewrite()
+        _LOGGER.debug("Loaded %d buffered snapshots", len(self._entries))
+
+    def append(self, snapshot_time, energy, metrics):
+        """Buffer a snapshot and append it to the file."""
+        entry = [time.time(), snapshot_time, energy, metrics]
+        with self._lock:
+            self._entries.append(entry)
+            if self._file_lines >= 2 * self._entries.maxlen:
+                self._rewrite()
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self._file_lines += 1
+
+    def peek_batch(self, size):
+        """Return up to size of the oldest entries, dropping expired ones.
+
+        The entries stay buffered until drop_batch() is called with them,
+        so a batch that fails to publish is replayed again later.
+        """
+        cutoff = time.time() - self.max_age
+        with self._lock:
+            while self._entries and self._entries[0][0] < cutoff:
+                self._entries.popleft()
+            return list(islice(self._entries, size))
+
+    def drop_batch(self, batch):
+        """Remove the entries of batch that are still the oldest buffered."""
+        with self._lock:
+            for entry in batch:
+                # Entries pushed out by appends meanwhile are already gone
+                if self._entries and self._entries[0] is entry:
+                    self._entries.popleft()
+
+    def compact(self):
+        """Rewrite the file so it holds exactly the buffered entries."""
+        with self._lock:
+            self._rewrite()
+
+    def _rewrite(self):
+        if not self._entries:
+            remove_buffer(self.path)
+            self._file_lines = 0
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            for entry in self._entries:
+                file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        os.replace(tmp_path, self.path)
+        self._file_lines = len(self._entries)
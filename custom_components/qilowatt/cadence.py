@@ -0,0 +1,58 @@
+"""Adaptive poll cadence for the Qilowatt data pipeline."""
+
+from .const import PASSIVE_WORKMODES, POLL_INTERVAL
+
+
+def is_active_workmode(command):
+    """Whether a WORKMODE command has Qilowatt actively steering power flow."""
+    if command is None:
+        return False
+    if command.PeakShaving:
+        return True
+    return command.Mode is not None and command.Mode not in PASSIVE_WORKMODES
+
+
+def grid_power(energy):
+    """Total grid power of the ENERGY fields of a snapshot, summed over phases."""
+    power = energy["Power"]
+    if isinstance(power, (list, tuple)):
+        return sum(power)
+    return power or 0
+
+
+class AdaptiveCadence:
+    """Poll interval that speeds up under control and backs off while idle.
+
+    The interval drops to fast_interval while an active WORKMODE is set or
+    grid power moved by at least grid_power_step since the previous
+    snapshot. Otherwise it doubles every tick up to idle_interval.
+    """
+
+    def __init__(self, fast_interval, idle_interval, grid_power_step):
+        self.fast_interval = fast_interval
+        self.idle_interval = idle_interval
+        self.grid_power_step = grid_power_step
+        self.interval = min(max(POLL_INTERVAL, fast_interval), idle_interval)
+        self.active = False
+        self._last_power = None
+
+    def set_workmode(self, command):
+        """Note the latest WORKMODE, return True when it requires fast ticks."""
+        self.active = is_active_workmode(command)
+        if self.active:
+            self.interval = self.fast_interval
+        return self.active
+
+    def observe(self, energy):
+        """Feed the ENERGY fields of a snapshot and return the next interval."""
+        power = grid_power(energy)
+        moved = (
+            self._last_power is not None
+            and abs(power - self._last_power) >= self.grid_power_step
+        )
+        self._last_power = power
+        if self.active or moved:
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.interval * 2, self.idle_interval)
+        return self.interval
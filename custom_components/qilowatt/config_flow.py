@@ -2,16 +2,121 @@ import voluptuous as vol
 
 from homeassistant import config_entries
 from homeassistant.core import callback
-from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import config_validation as cv, selector
 
 from .const import (
+    ACTUATION_FIELDS,
+    AGGREGATE_LAST,
+    AGGREGATE_MAX,
+    AGGREGATE_MEAN,
+    CONF_ACTUATION,
+    CONF_AGGREGATES,
+    CONF_BUFFER_MAX_AGE,
+    CONF_BUFFER_MAX_ENTRIES,
+    CONF_CONTROLS,
+    CONF_DEADBANDS,
+    CONF_DEBOUNCE,
     CONF_DEVICE_ID,
+    CONF_FAST_POLL_INTERVAL,
+    CONF_GRID_POWER_STEP,
+    CONF_IDLE_POLL_INTERVAL,
     CONF_INVERTER_ID,
     CONF_INVERTER_MODEL,
+    CONF_MAX_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MODE_OPTIONS,
     CONF_MQTT_PASSWORD,
     CONF_MQTT_USERNAME,
+    CONF_SAMPLE_INTERVAL,
+    CONF_STALE_ACTION,
+    CONF_STALE_AFTER,
+    CONF_UPDATE_MODE,
+    DEFAULT_ACTUATION,
+    DEFAULT_AGGREGATES,
+    DEFAULT_BUFFER_MAX_AGE,
+    DEFAULT_BUFFER_MAX_ENTRIES,
+    DEFAULT_DEADBANDS,
+    DEFAULT_DEBOUNCE,
+    DEFAULT_FAST_POLL_INTERVAL,
+    DEFAULT_GRID_POWER_STEP,
+    DEFAULT_IDLE_POLL_INTERVAL,
+    DEFAULT_MAX_PUBLISH_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    DEFAULT_SAMPLE_INTERVAL,
+    DEFAULT_STALE_ACTION,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_UPDATE_MODE,
     DOMAIN,
+    STALE_ACTION_FLAG,
+    STALE_ACTION_SUPPRESS,
+    UPDATE_MODE_POLL,
+    UPDATE_MODE_PUSH,
 )
+from .inverter import async_get_discovery
+
+# Option -> (default, validator)
+OPTIONS = {
+    CONF_UPDATE_MODE: (
+        DEFAULT_UPDATE_MODE,
+        vol.In([UPDATE_MODE_POLL, UPDATE_MODE_PUSH]),
+    ),
+    CONF_FAST_POLL_INTERVAL: (
+        DEFAULT_FAST_POLL_INTERVAL,
+        vol.All(vol.Coerce(float), vol.Range(min=1, max=60)),
+    ),
+    CONF_IDLE_POLL_INTERVAL: (
+        DEFAULT_IDLE_POLL_INTERVAL,
+        vol.All(vol.Coerce(float), vol.Range(min=1, max=600)),
+    ),
+    CONF_GRID_POWER_STEP: (
+        DEFAULT_GRID_POWER_STEP,
+        vol.All(vol.Coerce(float), vol.Range(min=0)),
+    ),
+    CONF_DEBOUNCE: (DEFAULT_DEBOUNCE, vol.All(vol.Coerce(float), vol.Range(min=0))),
+    CONF_MIN_PUBLISH_INTERVAL: (
+        DEFAULT_MIN_PUBLISH_INTERVAL,
+        vol.All(vol.Coerce(float), vol.Range(min=0)),
+    ),
+    CONF_MAX_PUBLISH_INTERVAL: (
+        DEFAULT_MAX_PUBLISH_INTERVAL,
+        vol.All(vol.Coerce(float), vol.Range(min=1)),
+    ),
+    CONF_SAMPLE_INTERVAL: (
+        DEFAULT_SAMPLE_INTERVAL,
+        vol.All(vol.Coerce(float), vol.Range(min=0, max=60)),
+    ),
+    CONF_STALE_AFTER: (
+        DEFAULT_STALE_AFTER,
+        vol.All(vol.Coerce(int), vol.Range(min=0)),
+    ),
+    CONF_STALE_ACTION: (
+        DEFAULT_STALE_ACTION,
+        vol.In([STALE_ACTION_FLAG, STALE_ACTION_SUPPRESS]),
+    ),
+    CONF_ACTUATION: (DEFAULT_ACTUATION, bool),
+    CONF_BUFFER_MAX_ENTRIES: (
+        DEFAULT_BUFFER_MAX_ENTRIES,
+        vol.All(vol.Coerce(int), vol.Range(min=0)),
+    ),
+    CONF_BUFFER_MAX_AGE: (
+        DEFAULT_BUFFER_MAX_AGE,
+        vol.All(vol.Coerce(int), vol.Range(min=0)),
+    ),
+}
+
+# Options edited as a mapping of field -> value: option -> (default, schema)
+MAPPING_OPTIONS = {
+    CONF_DEADBANDS: (
+        DEFAULT_DEADBANDS,
+        vol.Schema({str: vol.All(vol.Coerce(float), vol.Range(min=0))}),
+    ),
+    CONF_AGGREGATES: (
+        DEFAULT_AGGREGATES,
+        vol.Schema({str: vol.In([AGGREGATE_LAST, AGGREGATE_MEAN, AGGREGATE_MAX])}),
+    ),
+    CONF_CONTROLS: ({}, vol.Schema({vol.In(ACTUATION_FIELDS): cv.entity_id})),
+    CONF_MODE_OPTIONS: ({}, vol.Schema({str: str})),
+}
 
 
 class QilowattConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -19,10 +124,16 @@ class QilowattConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        """Return the options flow handler."""
+        return QilowattOptionsFlow()
+
     async def async_step_user(self, user_input=None):
         """Handle the initial step."""
         errors = {}
-        available_inverters = await self._discover_inverters()
+        available_inverters = await self._async_discover_inverters()
         if user_input is not None:
             # Validate the input here if needed
             if user_input is not None:
@@ -53,42 +164,52 @@ class QilowattConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
             step_id="user", data_schema=data_schema, errors=errors
         )
 
-    async def _discover_inverters(self):
-        """Discover inverters in Home Assistant."""
-        device_registry = dr.async_get(self.hass)
-        inverters = {}
-
-        for device in device_registry.devices.values():
-            for identifier in device.identifiers:
-                domain, device_id, *_ = identifier
-                if domain == "mqtt":
-                    # Solar Assistant inverter
-                    if "sa_inverter" in device_id:
-                        inverters[device.id] = {
-                            "name": device.name,
-                            "inverter_integration": "SolarAssistant",
-                        }
-                if domain == "solarman":
-                    # Solarman inverter integration
-                    inverters[device.id] = {
-                        "name": device.name,
-                        "inverter_integration": "Solarman",
-                    }
-                if domain == "solax_modbus":
-                    # Sofar Modbus inverter integration
-                    inverters[device.id] = {
-                        "name": device.name,
-                        "inverter_integration": "Sofar",
-                    }
-                if domain == "huawei_solar":
-                    # Huawei inverter integration
-                    inverters[device.id] = {
-                        "name": device.name,
-                        "inverter_integration": "Huawei",
-                    }
-            if "Deye" in device.name and "esp32" in device.model:
-                inverters[device.id] = {
-                    "name": device.name,
-                    "inverter_integration": "EspHome",
-                }
-        return inverters
+    async def _async_discover_inverters(self):
+        """Return the supported inverters found in the device registry."""
+        return (await async_get_discovery(self.hass)).inverters
+
+
+class QilowattOptionsFlow(config_entries.OptionsFlow):
+    """Handle Qilowatt publishing options."""
+
+    async def async_step_init(self, user_input=None):
+        """Manage the options."""
+        errors = {}
+        if user_input is not None:
+            for key, (_default, schema) in MAPPING_OPTIONS.items():
+                try:
+                    user_input[key] = schema(user_input.get(key) or {})
+                except vol.Invalid:
+                    errors[key] = f"invalid_{key}"
+            if (
+                user_input[CONF_FAST_POLL_INTERVAL]
+                > user_input[CONF_IDLE_POLL_INTERVAL]
+            ):
+                errors["base"] = "invalid_poll_interval"
+            elif (
+                user_input[CONF_MIN_PUBLISH_INTERVAL]
+                > user_input[CONF_MAX_PUBLISH_INTERVAL]
+            ):
+                errors["base"] = "invalid_publish_interval"
+            elif not errors:
+                # Keep options of earlier versions that are not in the form
+                return self.async_create_entry(
+                    data={**self.config_entry.options, **user_input}
+                )
+
+        current = {**self.config_entry.options, **(user_input or {})}
+        data_schema = vol.Schema(
+            {
+                vol.Required(key, default=current.get(key, default)): validator
+                for key, (default, validator) in OPTIONS.items()
+            }
+            | {
+                vol.Required(
+                    key, default=current.get(key, default)
+                ): selector.ObjectSelector()
+                for key, (default, _schema) in MAPPING_OPTIONS.items()
+            }
+        )
+        return self.async_show_form(
+            step_id="init", data_schema=data_schema, errors=errors
+        )
@@ -1,7 +1,110 @@
 DOMAIN = "qilowatt"
 DATA_CLIENT = "client"
+DATA_HUB = "hub"
+DATA_DISCOVERY = "discovery"
 CONF_INVERTER_MODEL = "inverter_model"
 CONF_INVERTER_ID = "inverter_id"
 CONF_MQTT_USERNAME = "mqtt_username"
 CONF_MQTT_PASSWORD = "mqtt_password"
 CONF_DEVICE_ID = "device_id"
+
+CONF_UPDATE_MODE = "update_mode"
+CONF_DEBOUNCE = "debounce"
+CONF_MIN_PUBLISH_INTERVAL = "min_publish_interval"
+CONF_MAX_PUBLISH_INTERVAL = "max_publish_interval"
+
+UPDATE_MODE_POLL = "poll"
+UPDATE_MODE_PUSH = "push"
+
+DEFAULT_UPDATE_MODE = UPDATE_MODE_POLL
+DEFAULT_DEBOUNCE = 0.5  # seconds
+DEFAULT_MIN_PUBLISH_INTERVAL = 1  # seconds
+DEFAULT_MAX_PUBLISH_INTERVAL = 60  # seconds
+
+STARTUP_TIMEOUT = 60  # seconds to wait for the inverter's entities at most
+# Share of the inverter's entities that must report a value to start early
+STARTUP_READY_SHARE = 0.8
+
+CONF_FAST_POLL_INTERVAL = "fast_poll_interval"
+CONF_IDLE_POLL_INTERVAL = "idle_poll_interval"
+CONF_GRID_POWER_STEP = "grid_power_step"
+
+POLL_INTERVAL = 10  # seconds, poll interval before the cadence adapts
+DEFAULT_FAST_POLL_INTERVAL = 1  # seconds, under active control
+DEFAULT_IDLE_POLL_INTERVAL = 60  # seconds, while nothing happens
+DEFAULT_GRID_POWER_STEP = 200  # W of grid power change that counts as activity
+PUBLISH_SPREAD = 2  # seconds a batch of publishes is spread over at most
+POLL_ALIGN = 0.5  # seconds, entries due this close together share a batch
+
+# WORKMODE modes in which Qilowatt is not steering the inverter
+PASSIVE_WORKMODES = ("normal", "nobattery")
+
+CONF_STALE_AFTER = "stale_after"
+CONF_STALE_ACTION = "stale_action"
+
+STALE_ACTION_FLAG = "flag"  # publish, report the stale inputs
+STALE_ACTION_SUPPRESS = "suppress"  # do not publish while an input is stale
+
+DEFAULT_STALE_AFTER = 300  # seconds without a report, 0 disables the check
+DEFAULT_STALE_ACTION = STALE_ACTION_FLAG
+
+CONF_ACTUATION = "actuation"
+# WORKMODE field -> entity_id replacing the built-in control, and WORKMODE
+# mode -> option of a Mode select
+CONF_CONTROLS = "controls"
+CONF_MODE_OPTIONS = "mode_options"
+
+DEFAULT_ACTUATION = False
+# WORKMODE fields written to the inverter, the mode before the limits
+ACTUATION_FIELDS = (
+    "Mode",
+    "PowerLimit",
+    "PeakShaving",
+    "ChargeCurrent",
+    "DischargeCurrent",
+)
+ACTUATION_VERIFY_TIMEOUT = 10  # seconds for the inverter to report a write
+
+CONF_SAMPLE_INTERVAL = "sample_interval"
+# Field -> aggregate of its samples
+CONF_AGGREGATES = "aggregates"
+
+AGGREGATE_LAST = "last"  # the reading at publish time
+AGGREGATE_MEAN = "mean"
+AGGREGATE_MAX = "max"
+
+DEFAULT_SAMPLE_INTERVAL = 0  # seconds between samples, 0 disables sampling
+# Fields not listed publish the last reading
+DEFAULT_AGGREGATES = {
+    "Power": AGGREGATE_MEAN,
+    "PvPower": AGGREGATE_MEAN,
+    "LoadPower": AGGREGATE_MEAN,
+    "BatteryPower": AGGREGATE_MEAN,
+}
+SAMPLE_WINDOW_SIZE = 120  # newest samples aggregated at most per publish
+
+CONF_DEADBANDS = "deadbands"
+
+# Per-field tolerance before a value counts as changed since the last publish
+DEFAULT_DEADBANDS = {
+    "Power": 5,  # W
+    "PvPower": 5,
+    "LoadPower": 5,
+    "BatteryPower": 5,
+    "Voltage": 0.1,  # V
+    "PvVoltage": 0.1,
+    "BatteryVoltage": 0.1,
+    "Current": 0.1,  # A
+    "PvCurrent": 0.1,
+    "LoadCurrent": 0.1,
+    "BatteryCurrent": 0.1,
+    "Frequency": 0.01,  # Hz
+}
+
+CONF_BUFFER_MAX_ENTRIES = "buffer_max_entries"
+CONF_BUFFER_MAX_AGE = "buffer_max_age"
+
+DEFAULT_BUFFER_MAX_ENTRIES = 8640  # 24h of 10s samples
+DEFAULT_BUFFER_MAX_AGE = 86400  # seconds
+REPLAY_BATCH_SIZE = 20  # snapshots per replay batch
+REPLAY_BATCH_INTERVAL = 1  # seconds between replay batches
@@ -0,0 +1,65 @@
+"""Qilowatt inverter device used by the integration."""
+
+from qilowatt import InverterDevice
+
+# Seconds between two STATUS0 publishes, as the library's timer
+STATUS0_INTERVAL = 3600
+
+
+class QilowattInverterDevice(InverterDevice):
+    """Inverter device whose publishes are driven by the integration.
+
+    The library publishes SENSOR, STATE and STATUS0 from three threads per
+    device. The integration publishes SENSOR explicitly instead, so push
+    mode can report changes immediately and stay quiet while nothing
+    changes, and the hub publishes STATE and STATUS0 of every device from
+    one timer.
+    """
+
+    # time.monotonic() the next STATUS0 is due, the first right away
+    _status0_due = 0.0
+
+    def _start_sensor_timer(self):
+        """Do not start the library's fixed-interval SENSOR timer."""
+
+    def _start_state_timer(self):
+        """Do not start the library's STATE timer, see publish_status()."""
+
+    def _start_status0_timer(self):
+        """Do not start the library's STATUS0 timer, see publish_status()."""
+
+    def publish_status(self, now):
+        """Publish STATE, and STATUS0 when due, once the data is set.
+
+        now is time.monotonic(). Blocking, STATUS0 resolves the host name.
+        """
+        if not self._data_initialized or not hasattr(self, "_publish_callback"):
+            return
+        self.publish_state_data()
+        if now >= self._status0_due:
+            self._status0_due = now + STATUS0_INTERVAL
+            self._publish_callback(
+                self.status0_topic, self.get_status0_data().to_dict()
+            )
+
+    def _stop_timers(self):
+        """Stop timers; QilowattMQTTClient.disconnect() calls this name."""
+        self.stop_timers()
+
+    def publish_buffered_data(self, snapshot_time, energy, metrics):
+        """Publish a buffered ENERGY/METRICS snapshot with its original Time.
+
+        Return whether the broker session accepted it.
+        """
+        if not hasattr(self, "_publish_callback"):
+            return False
+        return self._publish_callback(
+            self.sensor_topic,
+            {
+                "Time": snapshot_time,
+                "POWER1": 0,
+                "ENERGY": energy,
+                "METRICS": metrics,
+                "WORKMODE": self._workmode_command.__dict__,
+            },
+        )
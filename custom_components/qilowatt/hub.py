@@ -0,0 +1,299 @@
+"""Resources shared by all Qilowatt config entries of one Home Assistant."""
+
+import asyncio
+from datetime import timedelta
+import json
+import logging
+import time
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later, async_track_time_interval
+
+from paho.mqtt.client import MQTT_ERR_SUCCESS
+from qilowatt import QilowattMQTTClient
+
+from .const import DATA_HUB, DOMAIN, POLL_ALIGN, PUBLISH_SPREAD
+
+# Diagnostic sensors are refreshed at most this often
+STATS_INTERVAL = timedelta(minutes=1)
+# STATE of every inverter device is published this often, as the library does
+STATE_INTERVAL = timedelta(minutes=1)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class SharedQilowattMQTTClient(QilowattMQTTClient):
+    """Broker session serving every inverter that uses the same credentials.
+
+    The library binds a client to one device. This subclass keeps a device
+    per command topic, so inverters sharing an account share one connection
+    and one network thread.
+    """
+
+    def __init__(self, mqtt_username, mqtt_password, device):
+        # Command topic -> device, read by the paho network thread
+        self._devices = {device.command_topic: device}
+        super().__init__(mqtt_username, mqtt_password, device)
+        device.set_publish_callback(self._publish)
+
+    def _publish(self, topic, data):
+        """Publish data to topic, return whether paho accepted it."""
+        # The property also reports a drop paho noticed before its callback
+        if not self.connected:
+            _LOGGER.debug("Cannot publish to %s: not connected", topic)
+            return False
+        result = self._client.publish(topic, json.dumps(data))
+        if result.rc != MQTT_ERR_SUCCESS:
+            _LOGGER.warning("Failed to publish to %s: %s", topic, result.rc)
+            return False
+        return True
+
+    def connect(self):
+        """Connect to the broker and start the network loop.
+
+        When the broker cannot be reached the network loop keeps retrying
+        in the background, like paho does after a dropped connection, so
+        the entries sharing this session start anyway and buffer until it
+        is up.
+        """
+        with self._lock:
+            try:
+                self._client.connect(self.host, self.port, keepalive=30)
+            except OSError as err:
+                _LOGGER.warning(
+                    "Cannot connect to %s:%s, retrying in the background: %s",
+                    self.host,
+                    self.port,
+                    err,
+                )
+                self._client.connect_async(self.host, self.port, keepalive=30)
+            self._client.loop_start()
+
+    def disconnect(self):
+        """Stop the network loop, also while it is still retrying."""
+        with self._lock:
+            self._client.loop_stop()
+            self._client.disconnect()
+            if self._connected:
+                self._connected = False
+                self._notify_connection_change(False)
+        self.device._stop_timers()
+
+    def attach(self, device):
+        """Publish for device too and subscribe to its commands."""
+        device.set_publish_callback(self._publish)
+        self._devices = {**self._devices, device.command_topic: device}
+        if self._client.is_connected():
+            self._client.subscribe(device.command_topic)
+
+    def detach(self, device):
+        """Stop serving device, return True when no device is left."""
+        devices = dict(self._devices)
+        devices.pop(device.command_topic, None)
+        self._devices = devices
+        if self._client.is_connected():
+            self._client.unsubscribe(device.command_topic)
+        device.stop_timers()
+        return not devices
+
+    def _on_connect(self, client, userdata, flags, rc):
+        """Subscribe to the command topics of all devices."""
+        if rc != 0:
+            super()._on_connect(client, userdata, flags, rc)
+            return
+        _LOGGER.debug("Connected, serving %d inverters", len(self._devices))
+        self._connected = True
+        for topic in self._devices:
+            client.subscribe(topic)
+        self._notify_connection_change(True)
+
+    def _on_message(self, client, userdata, msg):
+        """Route a command to the device it is addressed to."""
+        device = self._devices.get(msg.topic)
+        if device is not None:
+            device.handle_command(msg.payload)
+
+
+class QilowattHub:
+    """Broker sessions and timers shared by the MQTTClients of all entries.
+
+    Poll mode entries are ticked by one timer, armed for the earliest due
+    entry. Entries due within POLL_ALIGN of each other are collected in one
+    pass, then published spread over up to PUBLISH_SPREAD seconds so many
+    inverters do not hit the broker at the same instant.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the hub."""
+        self.hass = hass
+        # (username, password) -> SharedQilowattMQTTClient
+        self._sessions = {}
+        self._session_lock = asyncio.Lock()
+        self._clients = []
+        # Poll mode client -> time.monotonic() its next poll is due
+        self._pollers = {}
+        # Poll mode clients whose last snapshot is still being published
+        self._publishing = set()
+        self._unsub_poll = None
+        self._unsub_stats = None
+        self._unsub_state = None
+
+    async def async_connect(self, client):
+        """Attach client to the session for its credentials and connect it."""
+        key = (client.mqtt_username, client.mqtt_password)
+        async with self._session_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = await self.hass.async_add_executor_job(
+                    SharedQilowattMQTTClient,
+                    client.mqtt_username,
+                    client.mqtt_password,
+                    client.qw_device,
+                )
+                # Connected once, paho reconnects by itself after a drop
+                await self.hass.async_add_executor_job(session.connect)
+                self._sessions[key] = session
+            else:
+                _LOGGER.debug("Reusing broker session for %s", client.inverter_id)
+                await self.hass.async_add_executor_job(session.attach, client.qw_device)
+        return session
+
+    async def async_disconnect(self, client):
+        """Detach client from its session, closing the session when unused."""
+        key = (client.mqtt_username, client.mqtt_password)
+        async with self._session_lock:
+            session = self._sessions.get(key)
+            if session is None:
+                return
+            if await self.hass.async_add_executor_job(
+                session.detach, client.qw_device
+            ):
+                del self._sessions[key]
+                await self.hass.async_add_executor_job(session.disconnect)
+
+    @callback
+    def async_add_client(self, client, poll=True):
+        """Start ticking client; poll clients are also published by the hub."""
+        self._clients.append(client)
+        if poll:
+            # The first poll is due right away, the client waited for its inputs
+            self._pollers[client] = time.monotonic()
+            self._async_schedule_poll()
+        if self._unsub_stats is None:
+            self._unsub_stats = async_track_time_interval(
+                self.hass, self._async_dispatch_stats, STATS_INTERVAL
+            )
+            self._unsub_state = async_track_time_interval(
+                self.hass, self._async_publish_status, STATE_INTERVAL
+            )
+
+    @callback
+    def async_remove_client(self, client):
+        """Stop ticking client and drop the timers nobody uses anymore."""
+        if client in self._clients:
+            self._clients.remove(client)
+        if self._pollers.pop(client, None) is not None:
+            self._async_schedule_poll()
+        if not self._clients and self._unsub_stats:
+            self._unsub_stats()
+            self._unsub_stats = None
+            self._unsub_state()
+            self._unsub_state = None
+
+    @callback
+    def async_poll_soon(self, client):
+        """Bring the next poll of client forward to its current interval."""
+        due = self._pollers.get(client)
+        if due is None:
+            return
+        self._pollers[client] = min(due, time.monotonic() + client.cadence.interval)
+        self._async_schedule_poll()
+
+    @callback
+    def _async_dispatch_stats(self, _now=None):
+        """Refresh the diagnostic sensors of every entry."""
+        for client in self._clients:
+            client.async_dispatch_stats()
+
+    async def _async_publish_status(self, _now=None):
+        """Publish STATE and due STATUS0 of every entry in one executor job."""
+        devices = [client.qw_device for client in self._clients]
+        await self.hass.async_add_executor_job(self._publish_status, devices)
+
+    @staticmethod
+    def _publish_status(devices):
+        """Publish the status of devices, in the executor."""
+        now = time.monotonic()
+        for device in devices:
+            try:
+                device.publish_status(now)
+            except Exception as e:  # pylint: disable=broad-except
+                _LOGGER.error("Error publishing status: %s", e)
+
+    @callback
+    def _async_schedule_poll(self):
+        """Arm the poll timer for the earliest due entry."""
+        if self._unsub_poll:
+            self._unsub_poll()
+            self._unsub_poll = None
+        if not self._pollers:
+            return
+        delay = min(self._pollers.values()) - time.monotonic()
+        self._unsub_poll = async_call_later(self.hass, max(delay, 0), self._async_poll)
+
+    @callback
+    def _async_poll(self, _now=None):
+        """Tick every poll mode entry that is due, as one batch."""
+        now = time.monotonic()
+        batch = []
+        for client, due in self._pollers.items():
+            if due > now + POLL_ALIGN:
+                continue
+            if client in self._publishing:
+                # The previous snapshot is still being published, skip a beat
+                client.stats.skipped_ticks += 1
+                self._pollers[client] = now + client.cadence.interval
+                continue
+            # Collect every snapshot of the batch at the same instant
+            try:
+                snapshot = client.async_take_snapshot()
+            except Exception as e:  # pylint: disable=broad-except
+                _LOGGER.error("Error updating data: %s", e)
+                snapshot = None
+            # The snapshot adjusted the cadence of the client
+            self._pollers[client] = now + client.cadence.interval
+            if snapshot is not None:
+                batch.append((client, snapshot))
+        self._async_schedule_poll()
+        if batch:
+            self._publishing.update(client for client, _snapshot in batch)
+            self.hass.loop.create_task(self._async_publish_batch(batch))
+
+    async def _async_publish_batch(self, batch):
+        """Publish the snapshots of a batch, spread out within the batch."""
+        fastest = min(client.cadence.interval for client, _snapshot in batch)
+        step = min(PUBLISH_SPREAD, fastest / 2) / len(batch)
+        try:
+            for index, (client, snapshot) in enumerate(batch):
+                if index:
+                    await asyncio.sleep(step)
+                if client not in self._pollers:
+                    continue
+                try:
+                    await client.async_send_snapshot(snapshot)
+                except Exception as e:  # pylint: disable=broad-except
+                    _LOGGER.error("Error updating data: %s", e)
+        finally:
+            self._publishing.difference_update(
+                client for client, _snapshot in batch
+            )
+
+
+@callback
+def async_get_hub(hass: HomeAssistant) -> QilowattHub:
+    """Return the hub of this Home Assistant instance, creating it once."""
+    data = hass.data.setdefault(DOMAIN, {})
+    hub = data.get(DATA_HUB)
+    if hub is None:
+        hub = data[DATA_HUB] = QilowattHub(hass)
+    return hub
@@ -1,24 +1,65 @@
-from .huawei import HuaweiInverter
-from .solarassistant import SolarAssistantInverter
-from .solarman import SolarmanInverter
-from .sofar import SofarInverter
-from .esphome import EspHomeInverter
+"""Registry of the supported inverter adapters.
 
-# from .deye_synsynk import SynsynkInverter
-# from .growatt import GrowattInverter
+Adapters are imported by model name on first use, so loading the
+integration does not import every adapter, nor the qilowatt library they
+build payloads with, before an entry needs one.
+"""
 
+import importlib
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.importlib import async_import_module
+
+from ..const import DATA_DISCOVERY, DOMAIN
+from .discovery import InverterDiscovery
+
+# Model name -> (module, class) of its adapter
 INVERTER_INTEGRATIONS = {
-    # "Synsynk": SynsynkInverter,
-    "SolarAssistant": SolarAssistantInverter,
-    "Solarman": SolarmanInverter,
-    "Sofar": SofarInverter,
-    "Huawei": HuaweiInverter,
-    "EspHome": EspHomeInverter,
+    # "Synsynk": ("deye_synsynk", "SynsynkInverter"),
+    # "Growatt": ("growatt", "GrowattInverter"),
+    "SolarAssistant": ("solarassistant", "SolarAssistantInverter"),
+    "Solarman": ("solarman", "SolarmanInverter"),
+    "Sofar": ("sofar", "SofarInverter"),
+    "Huawei": ("huawei", "HuaweiInverter"),
+    "EspHome": ("esphome", "EspHomeInverter"),
 }
 
 
-def get_inverter_class(model_name):
+def _adapter(model_name):
+    """(module name, class name) of the adapter for model_name."""
     try:
-        return INVERTER_INTEGRATIONS[model_name]
+        module, class_name = INVERTER_INTEGRATIONS[model_name]
     except KeyError:
         raise ValueError(f"Unsupported inverter model: {model_name}")
+    return f"{__name__}.{module}", class_name
+
+
+def get_inverter_class(model_name):
+    """Return the adapter class of model_name, importing it if needed.
+
+    Imports block; on the event loop use async_get_inverter_class.
+    """
+    module, class_name = _adapter(model_name)
+    return getattr(importlib.import_module(module), class_name)
+
+
+async def async_get_inverter_class(hass: HomeAssistant, model_name):
+    """Return the adapter class of model_name, imported in the executor."""
+    module, class_name = _adapter(model_name)
+    return getattr(await async_import_module(hass, module), class_name)
+
+
+async def async_get_discovery(hass: HomeAssistant) -> InverterDiscovery:
+    """Return the index of supported inverter devices, building it once."""
+    data = hass.data.setdefault(DOMAIN, {})
+    discovery = data.get(DATA_DISCOVERY)
+    if discovery is None:
+        # Every adapter contributes its DISCOVERY rules
+        integrations = {
+            model: await async_get_inverter_class(hass, model)
+            for model in INVERTER_INTEGRATIONS
+        }
+        discovery = data.get(DATA_DISCOVERY)
+        if discovery is None:
+            discovery = data[DATA_DISCOVERY] = InverterDiscovery(hass, integrations)
+    return discovery
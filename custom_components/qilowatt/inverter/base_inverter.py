@@ -1,21 +1,363 @@
 # custom_components/qilowatt/inverter/base_inverter.py
 
-from abc import ABC, abstractmethod
+import logging
+import time
+from abc import ABC
+
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import dt as dt_util
+
+from .mapping import FieldPlan, dimensions
+from .snapshot import Snapshot
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class BaseInverter(ABC):
-    """Abstract base class for inverter implementations."""
+    """Abstract base class for inverter implementations.
+
+    Subclasses declare ENERGY_FIELDS and METRICS_FIELDS tables (see
+    mapping.py), compiled into one FieldPlan per class and topology. The
+    topology, how many members each dimension of Series in the tables has,
+    is detected from the device's entities and follows registry changes.
+    """
+
+    ENERGY_FIELDS = {}
+    METRICS_FIELDS = {}
+    # DeviceMatch rules of the devices this adapter supports (discovery.py)
+    DISCOVERY = ()
+    # Control entities WORKMODE commands are written to (controls.py)
+    CONTROLS = ()
+    # Log a summary of unavailable or unconvertible entity reads
+    warn_unavailable = True
+    # Seconds between two unavailable-state summaries
+    unavailable_log_interval = 300
+    # Inputs not reported for longer than this many seconds are invalid,
+    # 0 disables the check; set by MQTTClient from the options
+    stale_after = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dimensions = dimensions(cls.ENERGY_FIELDS, cls.METRICS_FIELDS)
+        # Entity_ids that may be a member of a dimension
+        cls._member_patterns = [
+            series.pattern()
+            for members in cls._dimensions.values()
+            for series in members
+        ]
+        # Topology -> FieldPlan, shared by the instances of the class
+        cls._plans = {}
+        # Plan of the topology the Series assume before detection
+        cls._plan = cls._plan_for({}, frozenset())
+
+    @classmethod
+    def _plan_for(cls, topology, absent):
+        """Return the FieldPlan of topology, compiling it once per class."""
+        key = (tuple(sorted(topology.items())), absent)
+        plan = cls._plans.get(key)
+        if plan is None:
+            plan = cls._plans[key] = FieldPlan(
+                topology,
+                absent,
+                energy=cls.ENERGY_FIELDS,
+                metrics=cls.METRICS_FIELDS,
+            )
+        return plan
 
     def __init__(self, hass, config_entry):
         self.hass = hass
         self.config_entry = config_entry
+        self.device_id = config_entry.data.get("device_id")
+        self.entity_registry = er.async_get(hass)
+        self.inverter_entities = {}
+        for entity in self.entity_registry.entities.values():
+            if entity.device_id == self.device_id:
+                self.inverter_entities[entity.entity_id] = entity.name
+
+        # Logical key (e.g. "sofar_pv_power_1") -> concrete entity_id or None
+        self._entity_index = {}
+        # Logical key -> (State, parsed value or None, reason it is None)
+        self._parsed = {}
+        # Dimension -> member count of this device, and the member keys of
+        # detected members without an entity
+        self.topology, self.absent = self._detect_topology()
+        self._plan = self._plan_for(self.topology, self.absent)
+        # Refilled in place by every collection
+        self.snapshot = Snapshot(self._plan)
+        # Cumulative counters, read by MQTTClient for its diagnostics
+        self.lookup_count = 0
+        self.unavailable_count = 0
+        # Keys that failed to read since the last summary -> reason
+        self._unavailable_keys = {}
+        self._unavailable_logged = None
+        self._unsub_registry = hass.bus.async_listen(
+            er.EVENT_ENTITY_REGISTRY_UPDATED, self._async_registry_updated
+        )
+
+    @callback
+    def async_unload(self):
+        """Stop tracking entity registry changes."""
+        if self._unsub_registry:
+            self._unsub_registry()
+            self._unsub_registry = None
+
+    def resolve_entity_id(self, key):
+        """Return the entity_id a logical key resolves to, using the index."""
+        try:
+            return self._entity_index[key]
+        except KeyError:
+            entity_id = self._entity_index[key] = self._match_entity_id(key)
+            return entity_id
+
+    def _match_entity_id(self, key):
+        """Find the entity of this device whose entity_id ends with key."""
+        for entity_id in self.inverter_entities:
+            if entity_id.endswith(key):
+                return entity_id
+        return None
+
+    def _entity_exists(self, key):
+        """Whether key resolves to a registered entity."""
+        entity_id = self.resolve_entity_id(key)
+        return entity_id is not None and (
+            entity_id in self.inverter_entities
+            or self.entity_registry.async_get(entity_id) is not None
+        )
+
+    def _detect_topology(self):
+        """Count the members of each dimension among the registered entities.
+
+        Members are counted from 1 up to the first number none of the
+        dimension's Series has an entity for. A dimension without any
+        member keeps the count its Series assume. Return the counts and the
+        keys of counted members that lack the entity of one of the Series.
+        """
+        topology = {}
+        absent = set()
+        for dimension, members in self._dimensions.items():
+            count = 0
+            while True:
+                keys = [series.key(count + 1) for series in members]
+                exists = [self._entity_exists(key) for key in keys]
+                if not any(exists):
+                    break
+                count += 1
+                absent.update(key for key, found in zip(keys, exists) if not found)
+            topology[dimension] = count or max(series.count for series in members)
+        return topology, frozenset(absent)
+
+    @callback
+    def _async_update_topology(self):
+        """Re-detect the topology, switching plan and snapshot if it changed."""
+        topology, absent = self._detect_topology()
+        if topology == self.topology and absent == self.absent:
+            return
+        _LOGGER.debug(
+            "%s topology changed from %s to %s",
+            type(self).__name__,
+            self.topology,
+            topology,
+        )
+        self.topology = topology
+        self.absent = absent
+        self._plan = self._plan_for(topology, absent)
+        self.snapshot = Snapshot(self._plan)
+
+    def tracked_entity_ids(self):
+        """Return the entity_ids the field tables read from."""
+        tracked = set()
+        for key, _as_int, _default in self._plan.inputs:
+            entity_id = self.resolve_entity_id(key)
+            if entity_id is not None:
+                tracked.add(entity_id)
+        return tracked
+
+    def find_entity_state(self, entity_id):
+        """Helper method to find a state by entity_id suffix."""
+        self.lookup_count += 1
+        resolved = self.resolve_entity_id(entity_id)
+        if resolved is None:
+            return None
+        return self.hass.states.get(resolved)
+
+    @callback
+    def _async_registry_updated(self, event):
+        """Keep the device entity set and the resolved index in sync."""
+        action = event.data["action"]
+        entity_id = event.data["entity_id"]
+        old_entity_id = event.data.get("old_entity_id")
+
+        touched = {entity_id}
+        if old_entity_id:
+            touched.add(old_entity_id)
+            self.inverter_entities.pop(old_entity_id, None)
+
+        if action == "remove":
+            self.inverter_entities.pop(entity_id, None)
+        else:
+            entry = self.entity_registry.async_get(entity_id)
+            if entry is not None and entry.device_id == self.device_id:
+                self.inverter_entities[entity_id] = entry.name
+            else:
+                self.inverter_entities.pop(entity_id, None)
+
+        # Only re-resolve the keys the changed entity could affect
+        for key, resolved in list(self._entity_index.items()):
+            if resolved in touched or any(e.endswith(key) for e in touched):
+                self._entity_index[key] = self._match_entity_id(key)
+
+        if any(
+            pattern.search(entity_id)
+            for pattern in self._member_patterns
+            for entity_id in touched
+        ):
+            self._async_update_topology()
+
+    def _mark_unavailable(self, key, reason):
+        """Record a failed read for the next unavailable-state summary."""
+        self.unavailable_count += 1
+        self._unavailable_keys[key] = reason
+        _LOGGER.debug("State of %s is %s", key, reason)
+
+    def _log_unavailable_summary(self):
+        """Log the keys that failed to read, at most once per interval."""
+        if not self._unavailable_keys:
+            return
+        now = time.monotonic()
+        if (
+            self._unavailable_logged is not None
+            and now - self._unavailable_logged < self.unavailable_log_interval
+        ):
+            return
+        if self.warn_unavailable:
+            _LOGGER.warning(
+                "%s: %d inverter values could not be read or are stale: %s",
+                type(self).__name__,
+                len(self._unavailable_keys),
+                ", ".join(
+                    f"{key} ({reason})"
+                    for key, reason in sorted(self._unavailable_keys.items())
+                ),
+            )
+        self._unavailable_logged = now
+        self._unavailable_keys.clear()
+
+    def _state_number(self, state, key, as_int, default):
+        """Numeric value of state, default when it has none.
+
+        Home Assistant replaces the State object when an entity changes, so
+        the parsed value is cached per key until a different State shows up.
+        """
+        parsed = self._parsed.get(key)
+        if parsed is None or parsed[0] is not state:
+            parsed = self._parsed[key] = (state, *self._parse_state(state))
+        _state, value, reason = parsed
+        if value is None:
+            self._mark_unavailable(key, reason)
+            return default
+        return int(value) if as_int else value
+
+    @staticmethod
+    def _parse_state(state):
+        """Return (float value, None) or (None, reason it has no value)."""
+        if state and state.state not in ("unknown", "unavailable", ""):
+            try:
+                return float(state.state), None
+            except ValueError:
+                return None, "not a number"
+        return None, "unavailable or unknown"
+
+    def get_state_float(self, entity_id, default=0.0):
+        """Helper method to get a sensor state as float."""
+        state = self.find_entity_state(entity_id)
+        return self._state_number(state, entity_id, False, default)
+
+    def get_state_int(self, entity_id, default=0):
+        """Helper method to get a sensor state as int."""
+        state = self.find_entity_state(entity_id)
+        return self._state_number(state, entity_id, True, default)
+
+    def get_state_text(self, entity_id, default=""):
+        """Helper method to get a sensor state as text."""
+        state = self.find_entity_state(entity_id)
+        if state and state.state not in ("unknown", "unavailable", "", None):
+            return str(state.state)
+        self._mark_unavailable(entity_id, "unavailable, unknown or empty")
+        return default
+
+    def _read_inputs(self, slots, snapshot=None):
+        """Read the given input slots into snapshot in one pass.
+
+        snapshot defaults to the inverter's own; it must be of the current
+        plan.
+
+        The age of each input is taken from last_reported, which Home
+        Assistant refreshes on every write, even when the value is the same.
+        """
+        if snapshot is None:
+            snapshot = self.snapshot
+        inputs = self._plan.inputs
+        stale_exempt = self._plan.stale_exempt
+        values = snapshot.values
+        valid = snapshot.valid
+        ages = snapshot.ages
+        stale_after = self.stale_after
+        now = time.time()
+        oldest = None
+        stale = 0
+        for slot in slots:
+            key, as_int, default = inputs[slot]
+            ages[slot] = 0.0
+            if default is None and self.resolve_entity_id(key) is None:
+                # Optional sensor this inverter does not provide
+                values[slot] = None
+                valid[slot] = 0
+                continue
+            failed = self.unavailable_count
+            state = self.find_entity_state(key)
+            values[slot] = self._state_number(state, key, as_int, default)
+            if self.unavailable_count != failed:
+                valid[slot] = 0
+                continue
+            age = ages[slot] = now - state.last_reported_timestamp
+            if slot in stale_exempt:
+                valid[slot] = 1
+                continue
+            if oldest is None or age > oldest:
+                oldest = age
+            if stale_after and age > stale_after:
+                valid[slot] = 0
+                stale += 1
+                self._mark_unavailable(key, f"not reported for {age:.0f}s")
+            else:
+                valid[slot] = 1
+        snapshot.filled(dt_util.utc_from_timestamp(now), oldest, stale)
+        self._log_unavailable_summary()
+        return snapshot
+
+    @callback
+    def async_collect(self, snapshot=None):
+        """Refill and return the snapshot from hass.states, on the event loop.
+
+        snapshot defaults to the inverter's own, see _read_inputs.
+        """
+        return self._read_inputs(range(len(self._plan.inputs)), snapshot)
+
+    def _collected(self):
+        """The snapshot of the last collection, collecting if there is none.
+
+        ENERGY and METRICS are both built from one fill, so its staleness
+        covers every input of the tick.
+        """
+        if self.snapshot.time is None:
+            return self.async_collect()
+        return self.snapshot
 
-    @abstractmethod
     def get_energy_data(self):
-        """Retrieve ENERGY data."""
-        pass
+        """Retrieve ENERGY data of the last collection."""
+        return self._collected().energy_data()
 
-    @abstractmethod
     def get_metrics_data(self):
-        """Retrieve METRICS data."""
-        pass
+        """Retrieve METRICS data of the last collection."""
+        return self._collected().metrics_data()
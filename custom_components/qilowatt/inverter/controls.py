@@ -0,0 +1,127 @@
+# custom_components/qilowatt/inverter/controls.py
+"""Control entities a WORKMODE command is written to.
+
+Adapters list them in CONTROLS, keyed like the sensors of their field
+tables: a key resolves to the entity of the inverter device in one of the
+control's domains whose entity_id ends with it. Every control takes one
+WorkModeCommand field and knows the service that sets it, whether the
+entity can take a value and when it already has the value and so needs no
+write.
+
+PowerLimit only caps grid export in the export modes; in the others it is
+an import or charge power. export_limit() writes it to the entity an
+adapter reports as GridExportLimit in those modes only, and leaves the
+limit alone otherwise.
+"""
+
+# WORKMODE modes in which PowerLimit caps the power exported to the grid
+EXPORT_MODES = ("sell", "limitexport")
+
+
+class NumberControl:
+    """number entity set to a numeric command field, multiplied by scale.
+
+    With modes set, only commands of those WORKMODE modes are written.
+    """
+
+    __slots__ = ("field", "key", "scale", "modes")
+
+    domains = ("number", "input_number")
+
+    def __init__(self, field, key, scale=1, modes=None):
+        self.field = field
+        self.key = key
+        self.scale = scale
+        self.modes = modes
+
+    def target(self, command):
+        """Value the entity should take for command, None to leave it."""
+        if self.modes is not None and command.Mode not in self.modes:
+            return None
+        value = getattr(command, self.field, None)
+        if value is None:
+            return None
+        return value * self.scale
+
+    def accepts(self, state, target):
+        """Whether target is within the entity's min and max."""
+        minimum = state.attributes.get("min")
+        maximum = state.attributes.get("max")
+        return (minimum is None or target >= minimum) and (
+            maximum is None or target <= maximum
+        )
+
+    def matches(self, state, target):
+        """Whether state already holds target, within half a step."""
+        if state is None:
+            return False
+        try:
+            current = float(state.state)
+        except ValueError:
+            return False
+        step = state.attributes.get("step") or 1
+        return abs(current - target) < step / 2
+
+    def service_call(self, entity_id, target):
+        """(domain, service, data) writing target to entity_id."""
+        return entity_id.split(".", 1)[0], "set_value", {
+            "entity_id": entity_id,
+            "value": target,
+        }
+
+
+class SelectControl:
+    """select entity set to the option mapped from a command field.
+
+    options maps command values (e.g. WORKMODE modes) to select options;
+    values without a mapping are passed through unchanged, and left alone
+    when the entity has no such option.
+    """
+
+    __slots__ = ("field", "key", "options")
+
+    domains = ("select", "input_select")
+
+    def __init__(self, field, key, options=None):
+        self.field = field
+        self.key = key
+        self.options = options or {}
+
+    def target(self, command):
+        """Option the entity should take for command, None to leave it."""
+        value = getattr(command, self.field, None)
+        if value is None:
+            return None
+        return self.options.get(value, value)
+
+    def with_options(self, options):
+        """Copy of this control with options mapped on top of its own."""
+        return SelectControl(self.field, self.key, {**self.options, **options})
+
+    def accepts(self, state, target):
+        """Whether target is one of the entity's options."""
+        options = state.attributes.get("options")
+        return options is None or target in options
+
+    def matches(self, state, target):
+        """Whether state already has target selected."""
+        return state is not None and state.state == target
+
+    def service_call(self, entity_id, target):
+        """(domain, service, data) selecting target on entity_id."""
+        return entity_id.split(".", 1)[0], "select_option", {
+            "entity_id": entity_id,
+            "option": target,
+        }
+
+
+def control_for_entity(field, entity_id, options=None):
+    """Control writing field to an explicitly configured entity_id."""
+    if entity_id.split(".", 1)[0] in SelectControl.domains:
+        return SelectControl(field, entity_id, options)
+    return NumberControl(field, entity_id)
+
+
+def export_limit(key):
+    """PowerLimit written to the export limit entity key in EXPORT_MODES."""
+    return NumberControl("PowerLimit", key, modes=EXPORT_MODES)
@@ -0,0 +1,95 @@
+# custom_components/qilowatt/inverter/discovery.py
+"""Find inverter devices in the device registry.
+
+Each adapter lists the devices it supports as DeviceMatch rules in its
+DISCOVERY attribute. InverterDiscovery keeps an index of the matching
+devices, updated from device registry events, so the config flow does not
+walk the whole registry on every render.
+"""
+
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers import device_registry as dr
+
+
+class DeviceMatch:
+    """Rule matching a device; every given part must match, None matches any.
+
+    domain and identifier are matched against the device identifiers,
+    identifier, name and model as substrings.
+    """
+
+    __slots__ = ("domain", "identifier", "name", "model")
+
+    def __init__(self, domain=None, identifier=None, name=None, model=None):
+        self.domain = domain
+        self.identifier = identifier
+        self.name = name
+        self.model = model
+
+    def matches(self, device):
+        """Whether device satisfies this rule."""
+        if self.name is not None and self.name not in (device.name or ""):
+            return False
+        if self.model is not None and self.model not in (device.model or ""):
+            return False
+        if self.domain is None and self.identifier is None:
+            return True
+        for domain, device_id, *_ in device.identifiers:
+            if self.domain is not None and domain != self.domain:
+                continue
+            if self.identifier is not None and self.identifier not in device_id:
+                continue
+            return True
+        return False
+
+
+class InverterDiscovery:
+    """Index of device_id -> supported inverter, kept in sync with the registry."""
+
+    def __init__(self, hass: HomeAssistant, integrations) -> None:
+        """Build the index once and follow device registry changes."""
+        self.device_registry = dr.async_get(hass)
+        # (model name, rule) in INVERTER_INTEGRATIONS order, the last match wins
+        self._rules = [
+            (model, rule)
+            for model, inverter_class in integrations.items()
+            for rule in inverter_class.DISCOVERY
+        ]
+        self.inverters = {}
+        for device in self.device_registry.devices.values():
+            self._async_index(device)
+        self._unsub = hass.bus.async_listen(
+            dr.EVENT_DEVICE_REGISTRY_UPDATED, self._async_device_updated
+        )
+
+    @callback
+    def async_unload(self):
+        """Stop following device registry changes."""
+        if self._unsub:
+            self._unsub()
+            self._unsub = None
+
+    @callback
+    def _async_index(self, device):
+        """Add, update or drop one device in the index."""
+        model = None
+        for name, rule in self._rules:
+            if rule.matches(device):
+                model = name
+        if model is None:
+            self.inverters.pop(device.id, None)
+        else:
+            self.inverters[device.id] = {
+                "name": device.name,
+                "inverter_integration": model,
+            }
+
+    @callback
+    def _async_device_updated(self, event: Event) -> None:
+        """Re-index the device an event is about."""
+        device_id = event.data["device_id"]
+        device = self.device_registry.async_get(device_id)
+        if device is None:
+            self.inverters.pop(device_id, None)
+        else:
+            self._async_index(device)
@@ -0,0 +1,267 @@
+# custom_components/qilowatt/inverter/mapping.py
+"""Declarative field mapping for inverter adapters.
+
+An adapter describes its ENERGY and METRICS payloads as tables::
+
+    ENERGY_FIELDS = {
+        "Power": [Sensor("grid_l1_power", scale=-1), ...],
+        "Today": Sensor("today_energy_import"),
+        "Total": 0.0,
+    }
+
+Plain values are constants, lists build lists and Derived computes a value
+from other specs (V * I, P / V, ...). Per-phase and per-string quantities
+are derived element-wise over whole lists in one pass with Vector, see
+currents(), products() and phase_split(). Series stands for numbered
+sensors, one per PV string, battery module or load phase, as many as the
+device has; see dimensions(). The tables of a class are compiled once per
+topology into a flat list of entity reads plus one accessor per output
+field, so a tick reads every entity once and assembles the payloads in one
+pass.
+"""
+
+from operator import itemgetter
+import re
+
+# Dimensions of the device topology Series count members of
+STRINGS = "strings"
+BATTERIES = "batteries"
+LOAD_PHASES = "load_phases"
+
+
+class Sensor:
+    """Numeric value of the entity resolved from key, multiplied by scale.
+
+    An optional sensor reads None instead of a default when its entity is
+    missing or unavailable, and a missing one is not reported. A sensor
+    with stale=False is never stale, for settings that only report when
+    they are changed.
+    """
+
+    __slots__ = ("key", "scale", "default", "as_int", "stale")
+
+    def __init__(
+        self, key, scale=1, default=None, as_int=False, optional=False, stale=True
+    ):
+        self.key = key
+        self.scale = scale
+        self.as_int = as_int
+        self.stale = stale
+        if default is None and not optional:
+            default = 0 if as_int else 0.0
+        self.default = default
+
+
+class Series:
+    """One Sensor per member of a dimension, numbered from 1.
+
+    template holds "{}" for the member number. count is the number of
+    members assumed until the device's entities show how many there are.
+    The remaining keyword arguments are passed to every Sensor.
+    """
+
+    __slots__ = ("dimension", "template", "count", "options")
+
+    def __init__(self, dimension, template, count=1, **options):
+        self.dimension = dimension
+        self.template = template
+        self.count = count
+        self.options = options
+
+    def key(self, number):
+        """Key of the sensor of member number."""
+        return self.template.format(number)
+
+    def pattern(self):
+        """Regex matching the entity_ids of any member."""
+        before, after = self.template.split("{}")
+        return re.compile(f"{re.escape(before)}\\d+{re.escape(after)}$")
+
+    def sensors(self, count, absent=()):
+        """Sensors of members 1 to count.
+
+        Keys in absent are of members the device has without this entity;
+        their sensors are optional, so they read None instead of a zero.
+        """
+        sensors = []
+        for n in range(1, count + 1):
+            key = self.key(n)
+            if key in absent:
+                sensors.append(Sensor(key, **{**self.options, "optional": True}))
+            else:
+                sensors.append(Sensor(key, **self.options))
+        return sensors
+
+
+class Detected:
+    """spec when the device has members of series' dimension, else fallback."""
+
+    __slots__ = ("series", "fallback")
+
+    def __init__(self, series, fallback):
+        self.series = series
+        self.fallback = fallback
+
+
+class Derived:
+    """Value computed by func from the values of other specs."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+
+class Vector:
+    """Element-wise func over specs that each evaluate to a list."""
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+
+def _difference(a, b):
+    return a - b
+
+
+def _safe_product(a, b):
+    if a is None or b is None:
+        return 0
+    return a * b
+
+
+def _safe_ratio(a, b):
+    if a is None or not b:
+        return 0
+    return round(a / b, 2)
+
+
+def _split(total, phases, scale):
+    share = round((total or 0) * scale / phases)
+    return [share] * phases
+
+
+def difference(a, b):
+    """a - b, e.g. load as inverter output minus grid power."""
+    return Derived(_difference, a, b)
+
+
+def currents(powers, voltages):
+    """Per-phase P / V rounded to 2 digits, 0 where either is 0 or missing."""
+    return Vector(_safe_ratio, powers, voltages)
+
+
+def products(voltages, currents):
+    """Per-string V * I, 0 where either is missing."""
+    return Vector(_safe_product, voltages, currents)
+
+
+def phase_split(total, phases=3, scale=1):
+    """A system-wide total split into equal, rounded phase shares."""
+    return Derived(_split, total, phases, scale)
+
+
+def per_phase(phases, fallback):
+    """The phases Series when the device has those sensors, else fallback."""
+    return Detected(phases, fallback)
+
+
+def dimensions(*tables):
+    """Return {dimension: [Series]} of the Series used in the field tables."""
+    found = {}
+
+    def walk(spec):
+        if isinstance(spec, Series):
+            found.setdefault(spec.dimension, []).append(spec)
+        elif isinstance(spec, Detected):
+            walk(spec.series)
+            walk(spec.fallback)
+        elif isinstance(spec, (Derived, Vector)):
+            for arg in spec.args:
+                walk(arg)
+        elif isinstance(spec, (list, tuple)):
+            for item in spec:
+                walk(item)
+
+    for fields in tables:
+        for spec in fields.values():
+            walk(spec)
+    return found
+
+
+class FieldPlan:
+    """Compiled form of a set of named field tables.
+
+    counts maps each dimension to the number of members its Series expand
+    to; dimensions missing from it use the count of the Series. absent holds
+    the member keys of detected members that have no entity.
+    """
+
+    def __init__(self, counts=None, absent=frozenset(), **tables):
+        self.counts = counts or {}
+        self.absent = absent
+        # (key, as_int, default) per input slot
+        self.inputs = []
+        # Slots whose sensors all opted out of the staleness check
+        self.stale_exempt = set()
+        self._slot_by_input = {}
+        # table name -> (slots used, [(field, accessor)])
+        self.tables = {}
+        for name, fields in tables.items():
+            used = set()
+            outputs = [
+                (field, self._compile(spec, used)) for field, spec in fields.items()
+            ]
+            self.tables[name] = (sorted(used), outputs)
+
+    def _compile(self, spec, used):
+        """Turn a spec into an accessor taking the list of input values."""
+        if isinstance(spec, Sensor):
+            ident = (spec.key, spec.as_int, spec.default)
+            slot = self._slot_by_input.get(ident)
+            if slot is None:
+                slot = self._slot_by_input[ident] = len(self.inputs)
+                self.inputs.append(ident)
+                if not spec.stale:
+                    self.stale_exempt.add(slot)
+            elif spec.stale:
+                self.stale_exempt.discard(slot)
+            used.add(slot)
+            if spec.scale == 1:
+                return itemgetter(slot)
+            scale = spec.scale
+            if spec.default is None:
+                return lambda values: (
+                    None if values[slot] is None else values[slot] * scale
+                )
+            return lambda values: values[slot] * scale
+        if isinstance(spec, Series):
+            count = self.counts.get(spec.dimension, spec.count)
+            return self._compile(spec.sensors(count, self.absent), used)
+        if isinstance(spec, Detected):
+            if self.counts.get(spec.series.dimension, spec.series.count):
+                return self._compile(spec.series, used)
+            return self._compile(spec.fallback, used)
+        if isinstance(spec, Derived):
+            func = spec.func
+            args = tuple(self._compile(arg, used) for arg in spec.args)
+            return lambda values: func(*[arg(values) for arg in args])
+        if isinstance(spec, Vector):
+            func = spec.func
+            args = tuple(self._compile(arg, used) for arg in spec.args)
+            return lambda values: list(map(func, *[arg(values) for arg in args]))
+        if isinstance(spec, (list, tuple)):
+            items = tuple(self._compile(item, used) for item in spec)
+            return lambda values: [item(values) for item in items]
+        return lambda values: spec
+
+    def slots(self, name):
+        """Input slots read by the named table."""
+        return self.tables[name][0]
+
+    def build(self, name, values):
+        """Evaluate the named table into a dict of field values."""
+        return {field: accessor(values) for field, accessor in self.tables[name][1]}
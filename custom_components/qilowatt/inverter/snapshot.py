@@ -0,0 +1,75 @@
+# custom_components/qilowatt/inverter/snapshot.py
+"""Reusable reading of the inputs of an inverter.
+
+An inverter owns one Snapshot and refills it in place every tick. The
+EnergyData and MetricsData the qilowatt library publishes are only built
+from it at the publish boundary.
+"""
+
+from array import array
+
+from qilowatt import EnergyData, MetricsData
+
+
+class Snapshot:
+    """Input values of a FieldPlan with their validity, age and collection time.
+
+    values, valid and ages are indexed by input slot. valid[slot] is 1 when
+    the last fill read a fresh value, 0 when it fell back to the default or
+    the value is stale. ages[slot] is the seconds since the source entity
+    was last reported. time is the UTC datetime of the last fill, None
+    before it.
+    """
+
+    __slots__ = (
+        "plan",
+        "values",
+        "valid",
+        "ages",
+        "time",
+        "oldest_age",
+        "stale",
+        "_fields",
+    )
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.values = [None] * len(plan.inputs)
+        self.valid = bytearray(len(plan.inputs))
+        self.ages = array("d", bytes(8 * len(plan.inputs)))
+        self.time = None
+        # Age of the oldest input read, None when nothing could be read
+        self.oldest_age = None
+        # Number of inputs older than the staleness threshold
+        self.stale = 0
+        # Table name -> field values built from the current fill
+        self._fields = {}
+
+    def filled(self, time, oldest_age=None, stale=0):
+        """Mark the values as refilled at time, dropping built tables."""
+        self.time = time
+        self.oldest_age = oldest_age
+        self.stale = stale
+        self._fields.clear()
+
+    def fields(self, name):
+        """Field values of the named table, built once per fill.
+
+        The returned dict is replaced, not mutated, by the next fill.
+        """
+        fields = self._fields.get(name)
+        if fields is None:
+            fields = self._fields[name] = self.plan.build(name, self.values)
+        return fields
+
+    def replace_fields(self, name, fields):
+        """Use fields as the values of the named table until the next fill."""
+        self._fields[name] = fields
+
+    def energy_data(self):
+        """ENERGY of the last fill as the library dataclass."""
+        return EnergyData(**self.fields("energy"))
+
+    def metrics_data(self):
+        """METRICS of the last fill as the library dataclass."""
+        return MetricsData(**self.fields("metrics"))
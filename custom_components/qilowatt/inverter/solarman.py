@@ -1,132 +1,55 @@
-import logging
-
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import entity_registry as er
-from qilowatt import EnergyData, MetricsData
-
 from .base_inverter import BaseInverter
+from .controls import NumberControl, SelectControl, export_limit
+from .discovery import DeviceMatch
+from .mapping import STRINGS, Sensor, Series, currents
 
-_LOGGER = logging.getLogger(__name__)
+GRID_POWER = [Sensor(f"grid_l{n}_power") for n in (1, 2, 3)]
+GRID_VOLTAGE = [Sensor(f"grid_l{n}_voltage") for n in (1, 2, 3)]
+# WORKMODE modes -> option of the Deye work mode (limit control) select;
+# other modes leave it as it is
+WORK_MODES = {
+    "sell": "Selling First",
+    "pvsell": "Selling First",
+    "limitexport": "Zero Export to CT",
+}
 
 
 class SolarmanInverter(BaseInverter):
     """Implementation for Solarman integrated inverters."""
 
-    def __init__(self, hass: HomeAssistant, config_entry):
-        super().__init__(hass, config_entry)
-        self.hass = hass
-        self.device_id = config_entry.data["device_id"]
-        self.entity_registry = er.async_get(hass)
-        self.inverter_entities = {}
-        for entity in self.entity_registry.entities.values():
-            if entity.device_id == self.device_id:
-                self.inverter_entities[entity.entity_id] = entity.name
-
-    def find_entity_state(self, entity_id):
-        """Helper method to find a state by entity_id."""
-        return next(
-            (
-                self.hass.states.get(entity)
-                for entity in self.inverter_entities
-                if entity.endswith(entity_id)
-            ),
-            None,
-        )
-
-    def get_state_float(self, entity_id, default=0.0):
-        """Helper method to get a sensor state as float."""
-
-        state = self.find_entity_state(entity_id)
-        if state and state.state not in ("unknown", "unavailable", ""):
-            try:
-                return float(state.state)
-            except ValueError:
-                _LOGGER.warning(f"Could not convert state of {entity_id} to float")
-        else:
-            _LOGGER.warning(f"State of {entity_id} is unavailable or unknown")
-        return default
-
-    def get_state_int(self, entity_id, default=0):
-        """Helper method to get a sensor state as int."""
-        state = self.find_entity_state(entity_id)
-        if state and state.state not in ("unknown", "unavailable", ""):
-            try:
-                return int(float(state.state))
-            except ValueError:
-                _LOGGER.warning(f"Could not convert state of {entity_id} to int")
-        else:
-            _LOGGER.warning(f"State of {entity_id} is unavailable or unknown")
-        return default
-
-    def get_energy_data(self):
-        """Retrieve ENERGY data."""
-        power = [
-            self.get_state_float("grid_l1_power"),
-            self.get_state_float("grid_l2_power"),
-            self.get_state_float("grid_l3_power"),
-        ]
-        today = self.get_state_float("today_energy_import")
-        total = 0.0  # As per payload
-        voltage = [
-            self.get_state_float("grid_l1_voltage"),
-            self.get_state_float("grid_l2_voltage"),
-            self.get_state_float("grid_l3_voltage"),
-        ]
-        current = [round(x / y, 2) for x, y in zip(power, voltage)]
-        frequency = self.get_state_float("grid_frequency")
-
-        return EnergyData(
-            Power=power,
-            Today=today,
-            Total=total,
-            Current=current,
-            Voltage=voltage,
-            Frequency=frequency,
-        )
-
-    def get_metrics_data(self):
-        """Retrieve METRICS data."""
-        pv_power = [
-            self.get_state_float("pv1_power"),
-            self.get_state_float("pv2_power"),
-        ]
-        pv_voltage = [
-            self.get_state_float("pv1_voltage"),
-            self.get_state_float("pv2_voltage"),
-        ]
-        pv_current = [
-            self.get_state_float("pv1_current"),
-            self.get_state_float("pv2_current"),
-        ]
-        load_power = [
-            self.get_state_float("load_l1_power"),
-            self.get_state_float("load_l2_power"),
-            self.get_state_float("load_l3_power"),
-        ]
-        alarm_codes = [0, 0, 0, 0, 0, 0]  # As per payload
-        battery_soc = self.get_state_int("_battery")
-        load_current = [0.0, 0.0, 0.0]  # As per payload
-        battery_power = [-1 * self.get_state_float("battery_power")]
-        battery_current = [-1 * self.get_state_float("battery_current")]
-        battery_voltage = [self.get_state_float("battery_voltage")]
-        inverter_status = 2  # As per payload
-        grid_export_limit = self.get_state_float("pv_max_power")
-        battery_temperature = [self.get_state_float("battery_temperature")]
-        inverter_temperature = self.get_state_float("inverter_temperature")
-
-        return MetricsData(
-            PvPower=pv_power,
-            PvVoltage=pv_voltage,
-            PvCurrent=pv_current,
-            LoadPower=load_power,
-            AlarmCodes=alarm_codes,
-            BatterySOC=battery_soc,
-            LoadCurrent=load_current,
-            BatteryPower=battery_power,
-            BatteryCurrent=battery_current,
-            BatteryVoltage=battery_voltage,
-            InverterStatus=inverter_status,
-            GridExportLimit=grid_export_limit,
-            BatteryTemperature=battery_temperature,
-            InverterTemperature=inverter_temperature,
-        )
+    DISCOVERY = (DeviceMatch(domain="solarman"),)
+
+    # Controls of the Deye profiles, currents in A like the command
+    CONTROLS = (
+        SelectControl("Mode", "work_mode", WORK_MODES),
+        export_limit("pv_max_power"),
+        NumberControl("PeakShaving", "grid_peak_shaving_power"),
+        NumberControl("ChargeCurrent", "battery_max_charging_current"),
+        NumberControl("DischargeCurrent", "battery_max_discharging_current"),
+    )
+
+    ENERGY_FIELDS = {
+        "Power": GRID_POWER,
+        "Today": Sensor("today_energy_import"),
+        "Total": 0.0,  # As per payload
+        "Current": currents(GRID_POWER, GRID_VOLTAGE),
+        "Voltage": GRID_VOLTAGE,
+        "Frequency": Sensor("grid_frequency"),
+    }
+
+    METRICS_FIELDS = {
+        "PvPower": Series(STRINGS, "pv{}_power", count=2),
+        "PvVoltage": Series(STRINGS, "pv{}_voltage", count=2),
+        "PvCurrent": Series(STRINGS, "pv{}_current", count=2),
+        "LoadPower": [Sensor(f"load_l{n}_power") for n in (1, 2, 3)],
+        "AlarmCodes": [0, 0, 0, 0, 0, 0],  # As per payload
+        "BatterySOC": Sensor("_battery", as_int=True),
+        "LoadCurrent": [0.0, 0.0, 0.0],  # As per payload
+        "BatteryPower": [Sensor("battery_power", scale=-1)],
+        "BatteryCurrent": [Sensor("battery_current", scale=-1)],
+        "BatteryVoltage": [Sensor("battery_voltage")],
+        "InverterStatus": 2,  # As per payload
+        "GridExportLimit": Sensor("pv_max_power", stale=False),
+        "BatteryTemperature": [Sensor("battery_temperature")],
+        "InverterTemperature": Sensor("inverter_temperature"),
+    }
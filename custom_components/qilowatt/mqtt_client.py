@@ -1,15 +1,73 @@
 """MQTT client wrapper for Qilowatt integration."""
 
 import asyncio
+from datetime import timedelta
 import logging
+import time
 
-from homeassistant.core import HomeAssistant
+from homeassistant.const import STATE_UNAVAILABLE, STATE_UNKNOWN
+from homeassistant.core import Event, HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.event import (
+    async_call_later,
+    async_track_state_change_event,
+    async_track_time_interval,
+)
 
-from qilowatt import InverterDevice, QilowattMQTTClient, WorkModeCommand
+from qilowatt import WorkModeCommand
 
-from .const import DOMAIN
+from .actuation import WorkModeActuator
+from .buffer import TelemetryBuffer, buffer_path
+from .cadence import AdaptiveCadence
+from .const import (
+    CONF_ACTUATION,
+    CONF_AGGREGATES,
+    CONF_BUFFER_MAX_AGE,
+    CONF_BUFFER_MAX_ENTRIES,
+    CONF_CONTROLS,
+    CONF_DEADBANDS,
+    CONF_DEBOUNCE,
+    CONF_FAST_POLL_INTERVAL,
+    CONF_GRID_POWER_STEP,
+    CONF_IDLE_POLL_INTERVAL,
+    CONF_MAX_PUBLISH_INTERVAL,
+    CONF_MIN_PUBLISH_INTERVAL,
+    CONF_MODE_OPTIONS,
+    CONF_SAMPLE_INTERVAL,
+    CONF_STALE_ACTION,
+    CONF_STALE_AFTER,
+    CONF_UPDATE_MODE,
+    DEFAULT_ACTUATION,
+    DEFAULT_AGGREGATES,
+    DEFAULT_BUFFER_MAX_AGE,
+    DEFAULT_BUFFER_MAX_ENTRIES,
+    DEFAULT_DEADBANDS,
+    DEFAULT_DEBOUNCE,
+    DEFAULT_FAST_POLL_INTERVAL,
+    DEFAULT_GRID_POWER_STEP,
+    DEFAULT_IDLE_POLL_INTERVAL,
+    DEFAULT_MAX_PUBLISH_INTERVAL,
+    DEFAULT_MIN_PUBLISH_INTERVAL,
+    DEFAULT_SAMPLE_INTERVAL,
+    DEFAULT_STALE_ACTION,
+    DEFAULT_STALE_AFTER,
+    DEFAULT_UPDATE_MODE,
+    DOMAIN,
+    REPLAY_BATCH_INTERVAL,
+    REPLAY_BATCH_SIZE,
+    SAMPLE_WINDOW_SIZE,
+    STARTUP_READY_SHARE,
+    STALE_ACTION_SUPPRESS,
+    STARTUP_TIMEOUT,
+    UPDATE_MODE_PUSH,
+)
+from .device import QilowattInverterDevice
+from .hub import async_get_hub
 from .inverter import get_inverter_class
+from .sampling import SampleWindow
+from .snapshot_filter import SnapshotFilter
+from .stats import PipelineStats
+from .workmode import WorkModeCoordinator
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -27,55 +85,205 @@ class MQTTClient:
         self.inverter_id = config_entry.data["inverter_id"]
         self.inverter_model = config_entry.data["inverter_model"]
 
+        options = config_entry.options
+        self.update_mode = options.get(CONF_UPDATE_MODE, DEFAULT_UPDATE_MODE)
+        self.debounce = options.get(CONF_DEBOUNCE, DEFAULT_DEBOUNCE)
+        self.min_publish_interval = options.get(
+            CONF_MIN_PUBLISH_INTERVAL, DEFAULT_MIN_PUBLISH_INTERVAL
+        )
+        self.max_publish_interval = options.get(
+            CONF_MAX_PUBLISH_INTERVAL, DEFAULT_MAX_PUBLISH_INTERVAL
+        )
+        # Poll mode interval, fast under active control and slow while idle
+        self.cadence = AdaptiveCadence(
+            options.get(CONF_FAST_POLL_INTERVAL, DEFAULT_FAST_POLL_INTERVAL),
+            options.get(CONF_IDLE_POLL_INTERVAL, DEFAULT_IDLE_POLL_INTERVAL),
+            options.get(CONF_GRID_POWER_STEP, DEFAULT_GRID_POWER_STEP),
+        )
+        # Unchanged snapshots are re-sent at most every max_publish_interval
+        self.snapshot_filter = SnapshotFilter(
+            options.get(CONF_DEADBANDS, DEFAULT_DEADBANDS), self.max_publish_interval
+        )
+        # Snapshots taken while disconnected, replayed after reconnect
+        self.buffer = TelemetryBuffer(
+            buffer_path(hass, config_entry.entry_id),
+            options.get(CONF_BUFFER_MAX_ENTRIES, DEFAULT_BUFFER_MAX_ENTRIES),
+            options.get(CONF_BUFFER_MAX_AGE, DEFAULT_BUFFER_MAX_AGE),
+        )
+
+        # Broker session shared with entries using the same credentials
+        self.hub = async_get_hub(hass)
         self.qilowatt_client = None  # Will be initialized later
 
         # Initialize the inverter
         inverter_class = get_inverter_class(self.inverter_model)
         self.inverter = inverter_class(self.hass, config_entry)
-        self.qw_device = InverterDevice(device_id=self.inverter_id)
+        self.inverter.stale_after = options.get(CONF_STALE_AFTER, DEFAULT_STALE_AFTER)
+        self.stale_action = options.get(CONF_STALE_ACTION, DEFAULT_STALE_ACTION)
+        # Fields are sampled this often and published as aggregates, 0 publishes
+        # the readings at publish time
+        self.sample_interval = options.get(
+            CONF_SAMPLE_INTERVAL, DEFAULT_SAMPLE_INTERVAL
+        )
+        self.aggregates = options.get(CONF_AGGREGATES, DEFAULT_AGGREGATES)
+        self.window = None
+        self.qw_device = QilowattInverterDevice(device_id=self.inverter_id)
+        self.qw_device.set_command_callback(self._on_command_received)
+        # Latest WORKMODE, shared by the sensors and the cadence
+        self.workmode = WorkModeCoordinator(hass)
+        self.workmode.async_add_listener(self._async_workmode_changed)
 
-    def initialize_client(self):
-        """Initialize the Qilowatt MQTT client."""
-        _LOGGER.debug("Initializing Qilowatt MQTT client")
+        self._running = False
+        self.stats = PipelineStats()
+        # Writes the WORKMODE to the inverter's control entities when enabled
+        self.actuator = None
+        if options.get(CONF_ACTUATION, DEFAULT_ACTUATION):
+            self.actuator = WorkModeActuator(
+                hass,
+                config_entry,
+                self.inverter,
+                self.workmode,
+                self.stats,
+                options.get(CONF_CONTROLS),
+                options.get(CONF_MODE_OPTIONS),
+            )
 
-        self.qilowatt_client = QilowattMQTTClient(
-            mqtt_username=self.mqtt_username,
-            mqtt_password=self.mqtt_password,
-            device=self.qw_device,
+        self._start_task = None
+        self._update_task = None
+        self._replay_task = None
+        self._tracked_entity_ids = frozenset()
+        self._unsub_state_changes = None
+        self._unsub_publish = None
+        self._unsub_heartbeat = None
+        self._unsub_sample = None
+        self._last_publish = 0.0
+
+    @callback
+    def async_schedule_start(self):
+        """Start in the background, tied to the config entry."""
+        self._start_task = self.config_entry.async_create_background_task(
+            self.hass, self.start(), f"{DOMAIN} start {self.inverter_id}"
         )
-        self.qw_device.set_command_callback(self._on_command_received)
-        # Add connection status callback
-        self.qilowatt_client.add_connection_callback(self._on_connection_status_changed)
 
     async def start(self):
-        """Start the Qilowatt MQTT client."""
+        """Connect through the shared hub and start publishing once ready."""
         _LOGGER.debug("Starting Qilowatt MQTT client")
-        # Run the blocking initialization in the executor
-        if self.qilowatt_client is None:
-            await self.hass.async_add_executor_job(self.initialize_client)
-        # Run the blocking connect in the executor too
-        await self.hass.async_add_executor_job(self.qilowatt_client.connect)
+        await self.hass.async_add_executor_job(self.buffer.load)
+        # Connect while the inverter's entities come up
+        self.qilowatt_client, _ = await asyncio.gather(
+            self.hub.async_connect(self), self._async_wait_ready()
+        )
+        self.qilowatt_client.add_connection_callback(self._on_connection_status_changed)
+
+        self._running = True
+        if self.sample_interval:
+            self._unsub_sample = async_track_time_interval(
+                self.hass, self._async_sample, timedelta(seconds=self.sample_interval)
+            )
+        poll = self.update_mode != UPDATE_MODE_PUSH
+        # Poll mode entries are ticked by the hub, in one batch for all
+        self.hub.async_add_client(self, poll=poll)
+        if not poll:
+            self._update_task = self.hass.loop.create_task(self.async_start_push())
+        if self.qilowatt_client.connected:
+            # The session may have connected before our callback was added
+            async_dispatcher_send(
+                self.hass, f"{DOMAIN}_connection_status_{self.inverter_id}", True
+            )
+            self._async_start_replay()
+
+    @callback
+    def _async_inputs_ready(self, entity_ids):
+        """Whether enough of the inverter's entities report a value."""
+        available = 0
+        for entity_id in entity_ids:
+            state = self.hass.states.get(entity_id)
+            if state is not None and state.state not in (
+                STATE_UNAVAILABLE,
+                STATE_UNKNOWN,
+            ):
+                available += 1
+        return available >= STARTUP_READY_SHARE * len(entity_ids)
 
-        # Start data update loop
-        self.hass.loop.create_task(self.update_data_loop())
+    async def _async_wait_ready(self):
+        """Wait until the inverter's entities report values, or time out.
 
-    def stop(self):
-        """Stop the Qilowatt MQTT client."""
+        Only entities known to the registry or the state machine are waited
+        for; the others cannot report before they are created.
+        """
+        registry = self.inverter.entity_registry
+        entity_ids = {
+            entity_id
+            for entity_id in self.inverter.tracked_entity_ids()
+            if entity_id in registry.entities
+            or self.hass.states.get(entity_id) is not None
+        }
+        if not entity_ids or self._async_inputs_ready(entity_ids):
+            return
+        ready = self.hass.loop.create_future()
+
+        @callback
+        def _async_state_changed(_event: Event) -> None:
+            if not ready.done() and self._async_inputs_ready(entity_ids):
+                ready.set_result(None)
+
+        unsub = async_track_state_change_event(
+            self.hass, entity_ids, _async_state_changed
+        )
+        try:
+            async with asyncio.timeout(STARTUP_TIMEOUT):
+                await ready
+        except TimeoutError:
+            _LOGGER.warning(
+                "Inverter entities of %s not ready after %ss, starting anyway",
+                self.inverter_id,
+                STARTUP_TIMEOUT,
+            )
+        finally:
+            unsub()
+
+    async def async_stop(self):
+        """Stop tracking the inverter and release the broker session."""
+        self._running = False
+        self.hub.async_remove_client(self)
+        if self._start_task:
+            self._start_task.cancel()
+            self._start_task = None
+        if self._update_task:
+            self._update_task.cancel()
+            self._update_task = None
+        if self._replay_task:
+            self._replay_task.cancel()
+            self._replay_task = None
+        self._async_unsubscribe_push()
+        if self._unsub_sample:
+            self._unsub_sample()
+            self._unsub_sample = None
+        if self.actuator:
+            self.actuator.async_unload()
+        self.inverter.async_unload()
         _LOGGER.debug("Stopping Qilowatt MQTT client")
         if self.qilowatt_client:
-            self.qilowatt_client.disconnect()
+            self.qilowatt_client.remove_connection_callback(
+                self._on_connection_status_changed
+            )
+        # Also covers a start cancelled after its session connected
+        await self.hub.async_disconnect(self)
 
     def _on_command_received(self, command: WorkModeCommand):
         """Handle the WORKMODE command received from the MQTT broker."""
         _LOGGER.debug("Received WORKMODE command: %s", command)
-        # Dispatch the command to Home Assistant using async_dispatcher_send
+        # Hand the command over to the event loop, bursts are coalesced there
         self.hass.loop.call_soon_threadsafe(
-            async_dispatcher_send,
-            self.hass,
-            f"{DOMAIN}_workmode_update_{self.inverter_id}",
-            command,
+            self.workmode.async_set_command, command, time.monotonic()
         )
 
+    @callback
+    def _async_workmode_changed(self):
+        """Poll fast while the WORKMODE has Qilowatt steering the inverter."""
+        if self.cadence.set_workmode(self.workmode.command):
+            self.hub.async_poll_soon(self)
+
     def _on_connection_status_changed(self, connected: bool):
         """Handle MQTT connection status changes."""
         _LOGGER.debug("MQTT connection status changed: %s", connected)
@@ -86,35 +294,233 @@ class MQTTClient:
             f"{DOMAIN}_connection_status_{self.inverter_id}",
             connected,
         )
+        if connected:
+            self.hass.loop.call_soon_threadsafe(self._async_start_replay)
+
+    @callback
+    def _async_start_replay(self):
+        """Start replaying buffered snapshots unless already running."""
+        if not self._running or not len(self.buffer):
+            return
+        if self._replay_task and not self._replay_task.done():
+            return
+        self._replay_task = self.hass.loop.create_task(self._async_replay())
+
+    async def _async_replay(self):
+        """Replay buffered snapshots in rate-limited batches."""
+        _LOGGER.debug("Replaying %d buffered snapshots", len(self.buffer))
+        try:
+            while self.qilowatt_client.connected:
+                if not await self.hass.async_add_executor_job(self._replay_batch):
+                    break
+                await asyncio.sleep(REPLAY_BATCH_INTERVAL)
+        finally:
+            await self.hass.async_add_executor_job(self.buffer.compact)
+
+    def _replay_batch(self):
+        """Publish the oldest batch of buffered snapshots.
+
+        Only published snapshots leave the buffer. Return whether the whole,
+        non-empty batch was published, so the replay stops at the first
+        failure and resumes from there after the next reconnect.
+        """
+        batch = self.buffer.peek_batch(REPLAY_BATCH_SIZE)
+        published = []
+        for entry in batch:
+            _epoch, snapshot_time, energy, metrics = entry
+            if not self.qw_device.publish_buffered_data(
+                snapshot_time, energy, metrics
+            ):
+                _LOGGER.debug("Replay interrupted by a failed publish")
+                break
+            published.append(entry)
+        self.buffer.drop_batch(published)
+        return bool(batch) and len(published) == len(batch)
 
-    async def update_data_loop(self):
-        """Loop to periodically fetch data and send it to MQTT."""
-        # Initial delay to give MQTT client time to establish connection
-        await asyncio.sleep(5)
+    async def async_start_push(self):
+        """Publish once, then publish whenever a tracked input changes."""
+        # The first pass resolves every key the inverter reads
+        await self._async_publish(force=True)
 
-        while True:
-            try:
-                await self.hass.async_add_executor_job(self.update_data)
-            except Exception as e:  # pylint: disable=broad-except
-                _LOGGER.error("Error updating data: %s", e)
-            await asyncio.sleep(10)  # Adjust the interval as needed
+    @callback
+    def _async_unsubscribe_push(self):
+        """Remove push mode listeners and pending timers."""
+        for unsub in (
+            self._unsub_state_changes,
+            self._unsub_publish,
+            self._unsub_heartbeat,
+        ):
+            if unsub:
+                unsub()
+        self._unsub_state_changes = None
+        self._unsub_publish = None
+        self._unsub_heartbeat = None
 
-    def update_data(self):
-        """Fetch data from inverter and send to MQTT."""
+    @callback
+    def _async_track_inputs(self):
+        """Subscribe to state changes of exactly the entities the inverter reads."""
+        tracked = frozenset(self.inverter.tracked_entity_ids())
+        if tracked == self._tracked_entity_ids and self._unsub_state_changes:
+            return
+        if self._unsub_state_changes:
+            self._unsub_state_changes()
+        self._tracked_entity_ids = tracked
+        self._unsub_state_changes = async_track_state_change_event(
+            self.hass, tracked, self._async_input_changed
+        )
+        _LOGGER.debug("Push mode tracking %d entities", len(tracked))
+
+    @callback
+    def _async_input_changed(self, event: Event) -> None:
+        """Schedule a debounced publish when a tracked value changes."""
+        old_state = event.data["old_state"]
+        new_state = event.data["new_state"]
+        if new_state is None or (
+            old_state is not None and old_state.state == new_state.state
+        ):
+            # Attribute-only update, no input changed
+            return
+        if self._unsub_publish:
+            # A publish is already pending, this change will be included
+            return
+        since_last = time.monotonic() - self._last_publish
+        delay = max(self.debounce, self.min_publish_interval - since_last)
+        self._unsub_publish = async_call_later(
+            self.hass, delay, self._async_scheduled_publish
+        )
+
+    async def _async_scheduled_publish(self, _now) -> None:
+        """Run a publish scheduled by a change or the heartbeat."""
+        self._unsub_publish = None
+        await self._async_publish()
+
+    async def _async_publish(self, force=False) -> None:
+        """Publish the current snapshot and re-arm the heartbeat."""
+        try:
+            await self.async_update_data(force)
+        except Exception as e:  # pylint: disable=broad-except
+            _LOGGER.error("Error updating data: %s", e)
+        self._last_publish = time.monotonic()
+        if not self._running:
+            return
+
+        if self._unsub_heartbeat:
+            self._unsub_heartbeat()
+        self._unsub_heartbeat = async_call_later(
+            self.hass, self.max_publish_interval, self._async_scheduled_heartbeat
+        )
+        self._async_track_inputs()
+
+    async def _async_scheduled_heartbeat(self, _now) -> None:
+        """Publish at least every max_publish_interval seconds."""
+        self._unsub_heartbeat = None
+        await self._async_publish(force=True)
+
+    @callback
+    def async_dispatch_stats(self):
+        """Send the pipeline stats to the diagnostic sensors."""
+        async_dispatcher_send(
+            self.hass, f"{DOMAIN}_stats_update_{self.inverter_id}", self.stats.as_dict()
+        )
+
+    async def async_update_data(self, force=False):
+        """Collect data from the inverter on the event loop and publish it."""
+        snapshot = self.async_take_snapshot()
+        if snapshot is not None:
+            await self.async_send_snapshot(snapshot, force=force)
+
+    @callback
+    def async_take_snapshot(self):
+        """Refill the inverter snapshot from hass.states, None if not started."""
         # Skip if client doesn't exist
         if not self.qilowatt_client:
             _LOGGER.debug("MQTT client not initialized, skipping data update")
-            return
+            self.stats.skipped_ticks += 1
+            return None
+
+        # Reading hass.states is safe and cheap here, no thread hop needed
+        inverter = self.inverter
+        lookups = inverter.lookup_count
+        unavailable = inverter.unavailable_count
+        start = time.perf_counter()
+        snapshot = inverter.async_collect()
+        if self.sample_interval:
+            self._async_window(snapshot).aggregate(snapshot)
+        self.stats.collect.add(time.perf_counter() - start)
+        self.stats.lookups_per_tick = inverter.lookup_count - lookups
+        self.stats.unavailable_per_tick = inverter.unavailable_count - unavailable
+        self.stats.stale_inputs = snapshot.stale
+        self.stats.oldest_input_age = snapshot.oldest_age
+        self.cadence.observe(snapshot.fields("energy"))
+        return snapshot
+
+    @callback
+    def _async_window(self, snapshot):
+        """Sample window of the snapshot's plan, new after a topology change."""
+        if self.window is None or self.window.plan is not snapshot.plan:
+            self.window = SampleWindow(
+                snapshot.plan, SAMPLE_WINDOW_SIZE, self.aggregates
+            )
+        return self.window
+
+    @callback
+    def _async_sample(self, _now):
+        """Add the current inverter values to the sample window."""
+        window = self._async_window(self.inverter.snapshot)
+        window.add(self.inverter.async_collect(window.snapshot))
+
+    async def async_send_snapshot(self, snapshot, force=False):
+        """Publish a snapshot, or buffer it while disconnected.
 
+        Snapshots matching the last published one are skipped unless force
+        is set or the heartbeat is due. Snapshots with stale inputs are
+        dropped, even when forced, if stale_action is suppress.
+        """
+        start = time.perf_counter()
+        try:
+            await self._async_send_snapshot(snapshot, force)
+        finally:
+            self.stats.update.add(time.perf_counter() - start)
+
+    async def _async_send_snapshot(self, snapshot, force):
+        """Filter, then publish or buffer one snapshot."""
+        energy = snapshot.fields("energy")
+        metrics = snapshot.fields("metrics")
         # Check connection status using the connected property
-        if not self.qilowatt_client.connected:
-            _LOGGER.debug("MQTT client not connected, skipping data update")
+        connected = self.qilowatt_client.connected
+        if not connected:
+            self.stats.skipped_ticks += 1
+
+        if snapshot.stale and self.stale_action == STALE_ACTION_SUPPRESS:
+            _LOGGER.debug("%d inputs are stale, not publishing", snapshot.stale)
+            if connected:
+                self.stats.skipped_ticks += 1
+            return
+
+        if not force and not self.snapshot_filter.should_publish(energy, metrics):
+            _LOGGER.debug("Snapshot unchanged, skipping publish")
             return
 
-        # Fetch latest data from the inverter
-        energy_data = self.inverter.get_energy_data()
-        metrics_data = self.inverter.get_metrics_data()
+        if not connected:
+            _LOGGER.debug("MQTT client not connected, buffering snapshot")
+            await self.hass.async_add_executor_job(
+                self.buffer.append,
+                snapshot.time.replace(tzinfo=None).isoformat(),
+                energy,
+                metrics,
+            )
+            self.snapshot_filter.mark_published(energy, metrics)
+            return
+
+        # Only the qilowatt client calls go to the executor
+        await self.hass.async_add_executor_job(
+            self.publish_data, snapshot.energy_data(), snapshot.metrics_data()
+        )
+        self.snapshot_filter.mark_published(energy, metrics)
+        self.stats.record_publish()
 
-        # Set data in the qilowatt client
+    def publish_data(self, energy_data, metrics_data):
+        """Set data in the qilowatt client and publish it right away."""
         self.qw_device.set_energy_data(energy_data)
         self.qw_device.set_metrics_data(metrics_data)
+        self.qw_device.publish_sensor_data()
@@ -0,0 +1,142 @@
+"""Aggregation of inverter samples taken between two publishes."""
+
+from array import array
+import logging
+import math
+
+from .const import AGGREGATE_LAST, AGGREGATE_MAX, AGGREGATE_MEAN
+from .inverter.snapshot import Snapshot
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _mean(column):
+    return math.fsum(column) / len(column)
+
+
+AGGREGATES = {AGGREGATE_MEAN: _mean, AGGREGATE_MAX: max}
+
+
+def _readings(column):
+    """column without the NaN that stand for missing values."""
+    if math.isnan(math.fsum(column)):
+        return [value for value in column if value == value]
+    return column
+
+
+class SampleWindow:
+    """Ring of the sampled values of the aggregated fields of a FieldPlan.
+
+    Every sample is one row of a preallocated array('d') with a column per
+    value (a list field has one per element), so memory is fixed by size;
+    once full the oldest row is overwritten. aggregate() replaces those
+    fields of a snapshot with their aggregate over the window, the snapshot
+    itself being the last sample, and starts the next window. Samples are
+    collected into the window's own snapshot, so sampling never touches a
+    snapshot that is waiting to be published.
+    """
+
+    __slots__ = (
+        "plan",
+        "size",
+        "snapshot",
+        "_fields",
+        "_columns",
+        "_width",
+        "_samples",
+        "_index",
+        "_count",
+    )
+
+    def __init__(self, plan, size, aggregates):
+        self.plan = plan
+        self.size = size
+        self.snapshot = Snapshot(plan)
+        # (table, field, aggregate function) of the aggregated fields
+        self._fields = []
+        for name, (_slots, outputs) in plan.tables.items():
+            for field, _accessor in outputs:
+                aggregate = aggregates.get(field, AGGREGATE_LAST)
+                if aggregate == AGGREGATE_LAST:
+                    continue
+                if aggregate not in AGGREGATES:
+                    _LOGGER.warning("Unknown aggregate %s of %s", aggregate, field)
+                    continue
+                self._fields.append((name, field, AGGREGATES[aggregate]))
+        # (table, field, function, first column, list length or None),
+        # laid out by the first sample
+        self._columns = None
+        self._width = 0
+        self._samples = None
+        self._index = 0
+        self._count = 0
+
+    def __len__(self):
+        """Number of samples in the window."""
+        return self._count
+
+    def _row(self, snapshot):
+        """Values of the aggregated fields of snapshot, NaN for None."""
+        row = []
+        for name, field, _func in self._fields:
+            value = snapshot.fields(name)[field]
+            row.extend(value if isinstance(value, list) else (value,))
+        return array("d", [math.nan if value is None else value for value in row])
+
+    def _layout(self, snapshot):
+        """Fix the columns from the first sample and allocate the ring."""
+        self._columns = []
+        start = 0
+        for name, field, func in self._fields:
+            value = snapshot.fields(name)[field]
+            length = len(value) if isinstance(value, list) else None
+            self._columns.append((name, field, func, start, length))
+            start += 1 if length is None else length
+        self._width = start
+        self._samples = array("d", bytes(8 * self.size * start))
+
+    def add(self, snapshot):
+        """Sample the aggregated fields of a freshly filled snapshot."""
+        if not self._fields:
+            return
+        row = self._row(snapshot)
+        width = len(row)
+        if width != self._width:
+            # First sample, or a list field changed its length
+            self._layout(snapshot)
+            self._index = 0
+            self._count = 0
+        start = self._index * width
+        self._samples[start : start + width] = row
+        self._index = (self._index + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+
+    def aggregate(self, snapshot):
+        """Replace the aggregated fields of snapshot and empty the window."""
+        if not self._fields:
+            return
+        self.add(snapshot)
+        width = self._width
+        samples = self._samples[: self._count * width]
+        tables = {}
+        for name, field, func, start, length in self._columns:
+            last = snapshot.fields(name)[field]
+            values = []
+            for offset in range(1 if length is None else length):
+                readings = _readings(samples[start + offset :: width])
+                current = last if length is None else last[offset]
+                if not readings:
+                    values.append(current)
+                elif isinstance(current, int):
+                    values.append(round(func(readings)))
+                else:
+                    values.append(func(readings))
+            fields = tables.get(name)
+            if fields is None:
+                fields = tables[name] = dict(snapshot.fields(name))
+            fields[field] = values[0] if length is None else values
+        for name, fields in tables.items():
+            snapshot.replace_fields(name, fields)
+        self._index = 0
+        self._count = 0
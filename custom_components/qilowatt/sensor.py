@@ -1,12 +1,23 @@
 # custom_components/qilowatt/sensor.py
 
 import logging
-from homeassistant.components.sensor import SensorEntity, SensorEntityDescription
+from homeassistant.components.sensor import (
+    SensorDeviceClass,
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import (
+    PERCENTAGE,
+    EntityCategory,
+    UnitOfElectricCurrent,
+    UnitOfPower,
+    UnitOfTime,
+)
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
-from homeassistant.helpers.entity import DeviceInfo, async_generate_entity_id
-from qilowatt import WorkModeCommand
+from homeassistant.helpers.entity import DeviceInfo
 
 from .const import CONF_INVERTER_ID, DATA_CLIENT, DOMAIN
 
@@ -14,147 +25,218 @@ _LOGGER = logging.getLogger(__name__)
 
 ENTITY_ID_FORMAT = "sensor.{}"
 
-# Define the metadata for each field
-WORKMODE_FIELDS = {
-    "Mode": {
-        "name": "Mode",
-        "unit_of_measurement": None,
-        "device_class": None,
-        "state_class": None,
-    },
-    "_source": {
-        "name": "Source",
-        "unit_of_measurement": None,
-        "device_class": None,
-        "state_class": None,
-    },
-    "BatterySoc": {
-        "name": "Battery State of Charge",
-        "unit_of_measurement": "%",
-        "device_class": "battery",
-        "state_class": "measurement",
-    },
-    "PowerLimit": {
-        "name": "Power Limit",
-        "unit_of_measurement": "W",
-        "device_class": "power",
-        "state_class": "measurement",
-    },
-    "PeakShaving": {
-        "name": "Peak Shaving",
-        "unit_of_measurement": "W",
-        "device_class": "power",
-        "state_class": "measurement",
-    },
-    "ChargeCurrent": {
-        "name": "Charge Current",
-        "unit_of_measurement": "A",
-        "device_class": "current",
-        "state_class": "measurement",
-    },
-    "DischargeCurrent": {
-        "name": "Discharge Current",
-        "unit_of_measurement": "A",
-        "device_class": "current",
-        "state_class": "measurement",
-    },
-}
+# One sensor per WORKMODE command field, keys match WorkModeCommand
+WORKMODE_SENSORS = (
+    SensorEntityDescription(key="Mode", name="Mode"),
+    SensorEntityDescription(key="_source", name="Source"),
+    SensorEntityDescription(
+        key="BatterySoc",
+        name="Battery State of Charge",
+        native_unit_of_measurement=PERCENTAGE,
+        device_class=SensorDeviceClass.BATTERY,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="PowerLimit",
+        name="Power Limit",
+        native_unit_of_measurement=UnitOfPower.WATT,
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="PeakShaving",
+        name="Peak Shaving",
+        native_unit_of_measurement=UnitOfPower.WATT,
+        device_class=SensorDeviceClass.POWER,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="ChargeCurrent",
+        name="Charge Current",
+        native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
+        device_class=SensorDeviceClass.CURRENT,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+    SensorEntityDescription(
+        key="DischargeCurrent",
+        name="Discharge Current",
+        native_unit_of_measurement=UnitOfElectricCurrent.AMPERE,
+        device_class=SensorDeviceClass.CURRENT,
+        state_class=SensorStateClass.MEASUREMENT,
+    ),
+)
+
+
+def _duration_description(key):
+    return SensorEntityDescription(
+        key=key,
+        translation_key=key,
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    )
+
+
+# Data pipeline diagnostics, keys match PipelineStats.as_dict()
+DIAGNOSTIC_SENSORS = (
+    *(
+        _duration_description(f"{name}_duration_{label}")
+        for name in ("collect", "update", "actuation")
+        for label in ("p50", "p95", "max")
+    ),
+    SensorEntityDescription(
+        key="lookups_per_tick",
+        translation_key="lookups_per_tick",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="unavailable_states",
+        translation_key="unavailable_states",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="stale_inputs",
+        translation_key="stale_inputs",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="oldest_input_age",
+        translation_key="oldest_input_age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="publishes_per_minute",
+        translation_key="publishes_per_minute",
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="skipped_ticks",
+        translation_key="skipped_ticks",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="actuation_failures",
+        translation_key="actuation_failures",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+    SensorEntityDescription(
+        key="last_publish_age",
+        translation_key="last_publish_age",
+        native_unit_of_measurement=UnitOfTime.SECONDS,
+        device_class=SensorDeviceClass.DURATION,
+        state_class=SensorStateClass.MEASUREMENT,
+        entity_category=EntityCategory.DIAGNOSTIC,
+    ),
+)
 
 async def async_setup_entry(
     hass: HomeAssistant, config_entry: ConfigEntry, async_add_entities
 ):
     """Set up Qilowatt sensors."""
     inverter_id = config_entry.data[CONF_INVERTER_ID]
+    client = hass.data[DOMAIN][config_entry.entry_id][DATA_CLIENT]
 
     # Add sensors for WORKMODE commands
-    workmode_sensors = []
-    for field, metadata in WORKMODE_FIELDS.items():
-        entity_description = SensorEntityDescription(
-            key=field,
-            name=metadata["name"],
-            unit_of_measurement=metadata["unit_of_measurement"],
-            device_class=metadata["device_class"],
-            state_class=metadata["state_class"],
-        )
-        sensor = WorkModeSensor(
-            hass,
-            inverter_id,
-            entity_description,
-            config_entry,
-        )
-        workmode_sensors.append(sensor)
+    async_add_entities(
+        WorkModeSensor(hass, inverter_id, description, config_entry, client.workmode)
+        for description in WORKMODE_SENSORS
+    )
 
-    async_add_entities(workmode_sensors, update_before_add=True)
+    async_add_entities(
+        QilowattDiagnosticSensor(config_entry, client, description)
+        for description in DIAGNOSTIC_SENSORS
+    )
 
 class WorkModeSensor(SensorEntity):
-    """Sensor for WORKMODE command fields."""
-
-    def __init__(self, hass: HomeAssistant, inverter_id, entity_description: SensorEntityDescription, entry) -> None:
+    """Sensor for one WORKMODE command field."""
+
+    _attr_should_poll = False
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        inverter_id,
+        entity_description: SensorEntityDescription,
+        entry,
+        coordinator,
+    ) -> None:
+        """Initialize the sensor from the shared WORKMODE coordinator."""
         self.hass = hass
-        self._inverter_id = inverter_id
         self.entity_description = entity_description
-        self.entry = entry
-        self._name = entity_description.name
-        self._unique_id = f"{inverter_id}_{entity_description.key}"
-        self._state = None
-        self.entity_id = async_generate_entity_id(
-            ENTITY_ID_FORMAT, f"qw_{entity_description.key}", hass.states.async_entity_ids()
+        self.coordinator = coordinator
+        self._attr_unique_id = f"{inverter_id}_{entity_description.key}"
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, entry.entry_id)},
+            name=entry.title,
+            manufacturer="Qilowatt",
+            model=entry.data["inverter_model"],
+            via_device=(DOMAIN, entry.entry_id),
         )
+        # Suggested entity_id, the entity registry makes it unique (qw_mode_2)
+        self.entity_id = ENTITY_ID_FORMAT.format(f"qw_{entity_description.key}")
 
-    @property
-    def name(self):
-        """Return the name of the sensor."""
-        return self._name
-
-    @property
-    def unique_id(self):
-        """Return the unique ID of the sensor."""
-        return self._unique_id
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device information for the sensor."""
-        return DeviceInfo(
-            identifiers={(DOMAIN, self.entry.entry_id)},
-            name=self.entry.title,
-            manufacturer="Qilowatt",
-            model=self.entry.data["inverter_model"],
-            via_device=(DOMAIN, self.entry.entry_id),
+    async def async_added_to_hass(self):
+        """Listen for changes of this sensor's WORKMODE field."""
+        self._attr_native_value = self.coordinator.data.get(self.entity_description.key)
+        self.async_on_remove(
+            self.coordinator.async_add_listener(
+                self._handle_workmode_update, self.entity_description.key
+            )
         )
 
-    @property
-    def state(self):
-        """Return the state of the sensor."""
-        return self._state
+    @callback
+    def _handle_workmode_update(self):
+        """Write the changed WORKMODE field, within the coordinator's pass."""
+        self._attr_native_value = self.coordinator.data.get(self.entity_description.key)
+        self.async_write_ha_state()
 
-    @property
-    def unit_of_measurement(self):
-        """Return the unit of measurement of the sensor."""
-        return self.entity_description.unit_of_measurement
 
-    @property
-    def device_class(self):
-        """Return the device class of the sensor."""
-        return self.entity_description.device_class
+class QilowattDiagnosticSensor(SensorEntity):
+    """Diagnostic sensor exposing one data pipeline statistic."""
 
-    @property
-    def state_class(self):
-        """Return the state class of the sensor."""
-        return self.entity_description.state_class
+    _attr_has_entity_name = True
+    _attr_should_poll = False
 
-    async def async_added_to_hass(self):
-        """Register dispatcher to listen for WORKMODE updates."""
+    def __init__(
+        self, config_entry: ConfigEntry, client, description: SensorEntityDescription
+    ) -> None:
+        """Initialize the diagnostic sensor."""
+        self.config_entry = config_entry
+        self.client = client
+        self.entity_description = description
+        self._attr_unique_id = (
+            f"{config_entry.data[CONF_INVERTER_ID]}_{description.key}"
+        )
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, config_entry.entry_id)},
+            "name": config_entry.title,
+            "manufacturer": "Qilowatt",
+            "model": config_entry.data.get("inverter_model", "Unknown"),
+        }
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to the once-a-minute stats update."""
+        self._attr_native_value = self.client.stats.as_dict()[self.entity_description.key]
         self.async_on_remove(
             async_dispatcher_connect(
                 self.hass,
-                f"{DOMAIN}_workmode_update_{self._inverter_id}",
-                self._handle_workmode_update,
+                f"{DOMAIN}_stats_update_{self.config_entry.data[CONF_INVERTER_ID]}",
+                self._handle_stats_update,
             )
         )
 
-    async def _handle_workmode_update(self, command: WorkModeCommand):
-        """Handle WORKMODE command updates."""
-        _LOGGER.debug(f"WorkModeSensor '{self._name}' handling update.")
-        value = getattr(command, self.entity_description.key, None)
-        self._state = value
-        self.async_schedule_update_ha_state()
\ No newline at end of file
+    @callback
+    def _handle_stats_update(self, stats) -> None:
+        """Handle a stats update."""
+        self._attr_native_value = stats[self.entity_description.key]
+        self.async_write_ha_state()
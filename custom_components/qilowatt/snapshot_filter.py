@@ -0,0 +1,67 @@
+"""Change detection between consecutive Qilowatt snapshots."""
+
+import time
+
+
+def _within(old, new, deadband):
+    """Return True if new differs from old by at most deadband."""
+    if isinstance(new, list):
+        if not isinstance(old, list) or len(old) != len(new):
+            return False
+        return all(abs(n - o) <= deadband for o, n in zip(old, new, strict=True))
+    return abs(new - old) <= deadband
+
+
+class SnapshotFilter:
+    """Suppress snapshots that match the last published one.
+
+    Fields listed in deadbands may move by up to their deadband; all other
+    fields must match exactly. Comparison is against the last *published*
+    snapshot, so slow drift still gets published once it adds up. An
+    unchanged snapshot is still published every heartbeat seconds.
+    """
+
+    def __init__(self, deadbands, heartbeat):
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        self._last = None
+        self._last_time = 0.0
+
+    def should_publish(self, energy, metrics):
+        """Return True if the snapshot changed or the heartbeat is due.
+
+        energy and metrics are the field dicts of the snapshot.
+        """
+        if self._last is None:
+            return True
+        if time.monotonic() - self._last_time >= self.heartbeat:
+            return True
+        last_energy, last_metrics = self._last
+        return self._changed(last_energy, energy) or self._changed(
+            last_metrics, metrics
+        )
+
+    def mark_published(self, energy, metrics):
+        """Remember the snapshot that was just published."""
+        # Snapshot field dicts are replaced on refill, never mutated
+        self._last = (energy, metrics)
+        self._last_time = time.monotonic()
+
+    def _changed(self, last, current):
+        if current == last:
+            # Cheap fast path: nothing moved at all
+            return False
+        deadbands = self.deadbands
+        for field, value in current.items():
+            old = last.get(field)
+            if value == old:
+                continue
+            deadband = deadbands.get(field)
+            if deadband is None:
+                return True
+            try:
+                if not _within(old, value, deadband):
+                    return True
+            except TypeError:
+                return True
+        return False
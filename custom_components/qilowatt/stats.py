@@ -0,0 +1,95 @@
+"""Low-overhead instrumentation of the Qilowatt data pipeline."""
+
+from array import array
+from collections import deque
+import time
+
+
+class RollingWindow:
+    """Fixed-size ring of the most recent duration samples, in seconds."""
+
+    __slots__ = ("_samples", "_index", "_count")
+
+    def __init__(self, size=360):
+        self._samples = array("d", bytes(8 * size))
+        self._index = 0
+        self._count = 0
+
+    def add(self, value):
+        """Record one sample, overwriting the oldest once full."""
+        self._samples[self._index] = value
+        self._index = (self._index + 1) % len(self._samples)
+        if self._count < len(self._samples):
+            self._count += 1
+
+    def summary(self):
+        """Return (p50, p95, max) of the window, or None when empty."""
+        if not self._count:
+            return None
+        ordered = sorted(self._samples[: self._count])
+        last = self._count - 1
+        return (
+            ordered[round(last * 0.5)],
+            ordered[round(last * 0.95)],
+            ordered[last],
+        )
+
+
+class PipelineStats:
+    """Counters and timings collected by MQTTClient on every tick."""
+
+    def __init__(self):
+        self.collect = RollingWindow()
+        self.update = RollingWindow()
+        # WORKMODE received -> inverter reports it, see actuation.py
+        self.actuation = RollingWindow()
+        self.actuation_failures = 0
+        self.lookups_per_tick = 0
+        self.unavailable_per_tick = 0
+        self.stale_inputs = 0
+        self.oldest_input_age = None
+        self.skipped_ticks = 0
+        self.last_publish = None
+        self._publishes = deque()
+
+    def record_publish(self):
+        """Note a successful publish."""
+        now = time.monotonic()
+        self.last_publish = now
+        self._publishes.append(now)
+
+    def as_dict(self):
+        """Summarize the stats into the values the diagnostic sensors show."""
+        now = time.monotonic()
+        while self._publishes and now - self._publishes[0] > 60:
+            self._publishes.popleft()
+
+        data = {
+            "lookups_per_tick": self.lookups_per_tick,
+            "unavailable_states": self.unavailable_per_tick,
+            "stale_inputs": self.stale_inputs,
+            "oldest_input_age": (
+                None
+                if self.oldest_input_age is None
+                else round(self.oldest_input_age, 1)
+            ),
+            "publishes_per_minute": len(self._publishes),
+            "skipped_ticks": self.skipped_ticks,
+            "actuation_failures": self.actuation_failures,
+            "last_publish_age": (
+                None
+                if self.last_publish is None
+                else round(now - self.last_publish, 1)
+            ),
+        }
+        for name, window in (
+            ("collect", self.collect),
+            ("update", self.update),
+            ("actuation", self.actuation),
+        ):
+            summary = window.summary()
+            for label, index in (("p50", 0), ("p95", 1), ("max", 2)):
+                data[f"{name}_duration_{label}"] = (
+                    None if summary is None else round(summary[index] * 1000, 2)
+                )
+        return data
@@ -0,0 +1,77 @@
+"""Shared state of the WORKMODE commands received from Qilowatt."""
+
+import logging
+import time
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+
+from qilowatt import WorkModeCommand
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class WorkModeCoordinator:
+    """Hold the latest WORKMODE and notify listeners of the fields that changed.
+
+    Commands arrive on the MQTT thread and are handed over with
+    call_soon_threadsafe. A burst of commands reaching the event loop
+    together is applied once, with the latest command.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the coordinator."""
+        self.hass = hass
+        self.command = None
+        # time.monotonic() the current command was received
+        self.received = None
+        # Field -> value of the current command, empty until the first one
+        self.data = {}
+        self._pending = None
+        # Field (None for any field) -> listeners
+        self._listeners = {}
+
+    @callback
+    def async_add_listener(self, update_callback, field=None) -> CALLBACK_TYPE:
+        """Call update_callback when field, or any field if None, changes."""
+        listeners = self._listeners.setdefault(field, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_set_command(self, command: WorkModeCommand, received=None) -> None:
+        """Take a command, applying it once the current burst is over.
+
+        received is the time.monotonic() the command arrived, now if None.
+        """
+        if self._pending is None:
+            self.hass.loop.call_soon(self._async_apply)
+        self._pending = (command, time.monotonic() if received is None else received)
+
+    @callback
+    def _async_apply(self) -> None:
+        """Apply the latest pending command and notify changed fields."""
+        (command, received), self._pending = self._pending, None
+        data = dict(vars(command))
+        # Every field counts as changed on the first command
+        changed = [
+            field
+            for field, value in data.items()
+            if field not in self.data or self.data[field] != value
+        ]
+        self.command = command
+        self.received = received
+        self.data = data
+        if not changed:
+            _LOGGER.debug("WORKMODE unchanged")
+            return
+        _LOGGER.debug("WORKMODE fields changed: %s", changed)
+        for field in changed:
+            for update_callback in list(self._listeners.get(field, ())):
+                update_callback()
+        for update_callback in list(self._listeners.get(None, ())):
+            update_callback()